@@ -0,0 +1,40 @@
+"""adding head_sha to task
+
+Revision ID: 3d8e1f6a4c20
+Revises: 5b2f7c1d9e3a
+Create Date: 2026-10-18 14:37:05.602118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3d8e1f6a4c20"
+down_revision: Union[str, Sequence[str], None] = "5b2f7c1d9e3a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("task", sa.Column("head_sha", sa.String(length=40), nullable=True))
+    # Existing tasks already carry the commit in their payload. Older payloads
+    # hold it as a one-element list, so unwrap those instead of storing the
+    # list's JSON text.
+    op.execute(
+        """
+        UPDATE task SET head_sha = CASE
+            WHEN json_typeof(payload->'head_sha') = 'array'
+                THEN payload->'head_sha'->>0
+            ELSE payload->>'head_sha'
+        END
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("task", "head_sha")
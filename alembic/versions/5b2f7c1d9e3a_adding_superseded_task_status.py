@@ -0,0 +1,28 @@
+"""adding superseded task status
+
+Revision ID: 5b2f7c1d9e3a
+Revises: 821bb98c7936
+Create Date: 2026-10-18 10:12:41.218374
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b2f7c1d9e3a"
+down_revision: Union[str, Sequence[str], None] = "821bb98c7936"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TYPE taskstatus ADD VALUE IF NOT EXISTS 'SUPERSEDED'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres can't drop a value from an enum type; fold the rows back instead.
+    op.execute("UPDATE task SET status = 'FAILED' WHERE status = 'SUPERSEDED'")
@@ -0,0 +1,56 @@
+"""adding task query indexes
+
+Revision ID: 7a1c4e9b2d05
+Revises: 3d8e1f6a4c20
+Create Date: 2026-10-18 18:05:12.840215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7a1c4e9b2d05"
+down_revision: Union[str, Sequence[str], None] = "3d8e1f6a4c20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every task listing is ordered newest first by (created_at, id), so each index
+# ends with those columns and a page is a single index range scan.
+INDEXES = {
+    "ix_task_created": ["created_at", "id"],
+    "ix_task_status_created": ["status", "created_at", "id"],
+    "ix_task_repo_created": ["owner", "repo", "created_at", "id"],
+    "ix_task_pr_created": ["owner", "repo", "pr_number", "created_at", "id"],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # created_at used to default to the time the model was imported.
+    op.alter_column("task", "created_at", server_default=sa.func.now())
+
+    # Built concurrently so a large task table stays writable meanwhile; that
+    # can't run inside the migration's transaction.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(
+                name,
+                "task",
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(
+                name, table_name="task", postgresql_concurrently=True, if_exists=True
+            )
+
+    op.alter_column("task", "created_at", server_default=None)
@@ -0,0 +1,144 @@
+"""Compare the streaming diff parser with the previous splitlines() parser.
+
+    uv run python benchmarks/diff_parser.py [--files 2000] [--hunks 20]
+
+Checks that both produce the same hunks on a synthetic multi-file diff, then
+reports wall time and peak allocated memory for each.
+"""
+
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from typing import Dict, List
+from multi_agent_reviewer.utils.diff_utils import (
+    index_unified_diff,
+    iter_unified_diff,
+    parse_unified_diff,
+)
+
+HUNK_HEADER_RE = re.compile(r"^@@\s+-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s+@@")
+
+
+def legacy_parse_unified_diff(
+    diff_text: str, default_file: str | None = None
+) -> Dict[str, List[Dict]]:
+    # The parser as it was before the streaming rewrite, kept as the baseline.
+    files = {}
+    current_file = default_file
+    lines = diff_text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- "):
+            i += 1
+            if i < len(lines) and lines[i].startswith("+++ "):
+                path = lines[i][4:].split("\t")[0].strip()
+                if path.startswith("b/") or path.startswith("a/"):
+                    path = path[2:]
+                current_file = path
+                files.setdefault(current_file, [])
+        elif line.startswith("@@"):
+            m = HUNK_HEADER_RE.match(line)
+            if not m:
+                i += 1
+                continue
+            hunk_lines = []
+            i += 1
+            while (
+                i < len(lines)
+                and not lines[i].startswith("@@")
+                and not lines[i].startswith("--- ")
+            ):
+                hunk_lines.append(lines[i])
+                i += 1
+            if current_file:
+                files.setdefault(current_file, []).append(
+                    {
+                        "orig_start": int(m.group(1)),
+                        "orig_len": int(m.group(2) or "1"),
+                        "start": int(m.group(3)),
+                        "len": int(m.group(4) or "1"),
+                        "lines": hunk_lines,
+                    }
+                )
+            continue
+        else:
+            i += 1
+    return files
+
+
+def make_diff(n_files: int, n_hunks: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    out = []
+
+    for f in range(n_files):
+        out.append(f"--- a/pkg/module_{f}.py\n+++ b/pkg/module_{f}.py\n")
+        orig = new = 1
+
+        for _ in range(n_hunks):
+            orig += rng.randint(5, 50)
+            new = orig + (new - orig)
+            context = [f" context line {rng.random()}" for _ in range(6)]
+            removed = [f"-old = {rng.random()}" for _ in range(rng.randint(0, 8))]
+            added = [f"+new = {rng.random()}" for _ in range(rng.randint(1, 12))]
+            body = context[:3] + removed + added + context[3:]
+            orig_len = 6 + len(removed)
+            new_len = 6 + len(added)
+            out.append(f"@@ -{orig},{orig_len} +{new},{new_len} @@ def f():\n")
+            out.append("".join(line + "\n" for line in body))
+            orig += orig_len
+            new += new_len
+
+    return "".join(out)
+
+
+def measure(label: str, fn) -> object:
+    # Timed and memory-traced in separate runs; tracemalloc slows the parse
+    # down several times over.
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+
+    del result
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:>9.1f} ms {peak / 1024**2:>9.1f} MiB peak")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--hunks", type=int, default=20)
+    args = parser.parse_args()
+
+    diff = make_diff(args.files, args.hunks)
+    print(f"diff: {len(diff) / 1024**2:.1f} MiB, {args.files * args.hunks} hunks")
+
+    old = measure("legacy parse_unified_diff", lambda: legacy_parse_unified_diff(diff))
+    new = measure("parse_unified_diff", lambda: parse_unified_diff(diff))
+    assert old == new, "parsers disagree"
+
+    chunks = [diff[i : i + 64 * 1024] for i in range(0, len(diff), 64 * 1024)]
+    measure(
+        "iter_unified_diff (chunks)",
+        lambda: sum(1 for _ in iter_unified_diff(iter(chunks))),
+    )
+    index = measure("index_unified_diff", lambda: index_unified_diff(diff))
+
+    lookups = [
+        (f"pkg/module_{f % args.files}.py", f * 7 % 5000) for f in range(100_000)
+    ]
+    started = time.perf_counter()
+    for path, line in lookups:
+        index[path].locate(line)
+    elapsed = time.perf_counter() - started
+    print(f"{'DiffIndex.locate':<28} {elapsed / len(lookups) * 1e6:>9.2f} us/lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""A local stand-in for the parts of GitHub the reviewer talks to.
+
+    uv run python benchmarks/fake_github.py [--port 9100] [--repos 2] [--prs 5]
+
+Serves, over plain HTTP:
+- installation access tokens, minted for any app JWT;
+- pull request diffs and paginated file lists, and compare diffs;
+- git smart HTTP for cloning, through `git http-backend`.
+
+The repositories are real git repositories generated on disk by
+build_scenario(), so the static checks have real Python to lint. load.py runs
+the server in-process. Run on its own, it builds a small scenario and serves
+it until interrupted.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+import orjson
+
+OWNER = "bench"
+INSTALLATION_ID = 1
+
+# Fixed identity and dates, so a seed always produces the same commits.
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_AUTHOR_DATE": "2024-01-01T00:00:00Z",
+    "GIT_COMMITTER_DATE": "2024-01-01T00:00:00Z",
+}
+
+
+@dataclass
+class PullRequest:
+    owner: str
+    repo: str
+    number: int
+    title: str
+    base: str
+    # One commit per push; the webhook replayer moves `head` along them.
+    heads: List[str]
+    head: str = ""
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}"
+
+
+def _git(args: List[str], cwd: str) -> str:
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        env={**os.environ, **GIT_ENV},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def _function(rng: random.Random, name: str) -> List[str]:
+    # Mostly clean code, with the occasional finding for the analyzers.
+    body = [f"def {name}(value):", f'    """Compute {name}."""']
+    for i in range(rng.randint(2, 8)):
+        body.append(f"    value = value * {rng.randint(2, 9)} + {i}")
+    if rng.random() < 0.3:
+        body.append("    unused = value")
+    if rng.random() < 0.2:
+        body.append(f"    return value+{rng.randint(1, 9)}  # {'x' * 80}")
+    else:
+        body.append("    return value")
+    return body + ["", ""]
+
+
+def _module(rng: random.Random, index: int, functions: int) -> List[str]:
+    lines = ['"""Generated module."""', "", ""]
+    for f in range(functions):
+        lines += _function(rng, f"func_{index}_{f}")
+    return lines
+
+
+def _edit(rng: random.Random, lines: List[str], tag: str) -> List[str]:
+    # Inserts a function and rewrites a couple of lines elsewhere, giving the
+    # diff several hunks.
+    starts = [i for i, line in enumerate(lines) if line.startswith("def ")]
+    at = rng.choice(starts) if starts else len(lines)
+    lines = lines[:at] + _function(rng, f"added_{tag}") + lines[at:]
+
+    for _ in range(2):
+        candidates = [i for i, line in enumerate(lines) if "value * " in line]
+        if candidates:
+            i = rng.choice(candidates)
+            lines[i] = lines[i].replace("value * ", f"value * {rng.randint(2, 9)} * ")
+
+    return lines
+
+
+def build_scenario(
+    root: str,
+    repos: int,
+    prs: int,
+    pushes: int = 1,
+    files: int = 20,
+    changed: int = 4,
+    functions: int = 12,
+    seed: int = 0,
+) -> List[PullRequest]:
+    # Each repository gets a base commit of `files` modules, and each of its
+    # PRs a branch with `pushes` commits, each editing `changed` modules.
+    rng = random.Random(seed)
+    pulls = []
+
+    for r in range(repos):
+        name = f"bench-repo-{r}"
+        work = os.path.join(root, "work", name)
+        os.makedirs(os.path.join(work, "pkg"))
+        _git(["init", "--quiet", "--initial-branch", "main"], work)
+
+        sources = {
+            f"pkg/module_{i}.py": _module(rng, i, functions) for i in range(files)
+        }
+        for path, lines in sources.items():
+            with open(os.path.join(work, path), "w") as f:
+                f.write("\n".join(lines))
+        _git(["add", "-A"], work)
+        _git(["commit", "--quiet", "-m", "base"], work)
+        base = _git(["rev-parse", "HEAD"], work)
+
+        for n in range(1, prs + 1):
+            _git(["checkout", "--quiet", "-B", f"pr-{n}", base], work)
+            current = dict(sources)
+            heads = []
+
+            for p in range(pushes):
+                for path in rng.sample(sorted(current), min(changed, len(current))):
+                    current[path] = _edit(rng, current[path], f"{n}_{p}")
+                    with open(os.path.join(work, path), "w") as f:
+                        f.write("\n".join(current[path]))
+                _git(["commit", "--quiet", "-am", f"PR {n} push {p}"], work)
+                heads.append(_git(["rev-parse", "HEAD"], work))
+
+            pulls.append(
+                PullRequest(OWNER, name, n, f"Bench PR {n}", base, heads, heads[0])
+            )
+
+        bare = os.path.join(root, "git", OWNER, f"{name}.git")
+        _git(["clone", "--quiet", "--bare", work, bare], root)
+        # What GitHub allows: blobless partial clones and fetching by sha.
+        _git(["config", "uploadpack.allowFilter", "true"], bare)
+        _git(["config", "uploadpack.allowAnySHA1InWant", "true"], bare)
+
+    return pulls
+
+
+def _split_files(diff: str) -> List[dict]:
+    files = []
+
+    for section in re.split(r"^diff --git ", diff, flags=re.MULTILINE)[1:]:
+        header, sep, patch = section.partition("\n@@")
+        new = re.search(r"^\+\+\+ b/(.+)$", header, re.MULTILINE)
+        old = re.search(r"^--- a/(.+)$", header, re.MULTILINE)
+        patch = ("@@" + patch) if sep else ""
+        additions = sum(1 for line in patch.splitlines() if line.startswith("+"))
+        deletions = sum(1 for line in patch.splitlines() if line.startswith("-"))
+        files.append(
+            {
+                "filename": (new or old).group(1),
+                "status": "modified" if new and old else "added" if new else "removed",
+                "additions": additions,
+                "deletions": deletions,
+                "changes": additions + deletions,
+                "patch": patch,
+            }
+        )
+
+    return files
+
+
+@dataclass
+class FakeGitHub:
+    root: str
+    pulls: List[PullRequest]
+    requests: Counter = field(default_factory=Counter)
+
+    def __post_init__(self):
+        self.git_root = os.path.join(self.root, "git")
+        self.by_number = {(p.full_name, p.number): p for p in self.pulls}
+        self._diffs: Dict[Tuple[str, str, str], str] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.github = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def diff(self, full_name: str, base: str, head: str) -> str:
+        key = (full_name, base, head)
+        if key not in self._diffs:
+            bare = os.path.join(self.git_root, f"{full_name}.git")
+            self._diffs[key] = (
+                _git(["diff", "--no-color", f"{base}...{head}"], bare) + "\n"
+            )
+        return self._diffs[key]
+
+    def compare_status(self, full_name: str, base: str, head: str) -> str:
+        bare = os.path.join(self.git_root, f"{full_name}.git")
+        behind, ahead = _git(
+            ["rev-list", "--left-right", "--count", f"{base}...{head}"], bare
+        ).split()
+
+        if int(behind) and int(ahead):
+            return "diverged"
+        return "ahead" if int(ahead) else "behind" if int(behind) else "identical"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("POST", re.compile(r"^/app/installations/(\d+)/access_tokens$"), "token"),
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/pulls/(\d+)/files$"), "files"),
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/pulls/(\d+)$"), "pull"),
+        (
+            "GET",
+            re.compile(r"^/repos/([^/]+/[^/]+)/compare/(\w+)\.\.\.(\w+)$"),
+            "compare",
+        ),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def github(self) -> FakeGitHub:
+        return self.server.github
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+
+        if ".git/" in url.path:
+            self.github.count("git")
+            return self._git_backend(method, url)
+
+        for route_method, pattern, name in self.ROUTES:
+            m = pattern.match(url.path)
+            if m and route_method == method:
+                self.github.count(name)
+                return getattr(self, f"_{name}")(parse_qs(url.query), *m.groups())
+
+        self._send(404, {"message": "Not Found"})
+
+    def _send(self, status: int, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else orjson.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-RateLimit-Remaining", "5000")
+        self.send_header(
+            "X-RateLimit-Reset", str(int(datetime.now().timestamp()) + 3600)
+        )
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _token(self, query, installation_id: str):
+        self._read_body()
+        expires = datetime.now(timezone.utc) + timedelta(hours=1)
+        self._send(
+            201,
+            {
+                "token": f"ghs_fake_{installation_id}",
+                "expires_at": expires.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            },
+        )
+
+    def _pull_request(self, full_name: str, number: str) -> PullRequest | None:
+        pull = self.github.by_number.get((full_name, int(number)))
+        if pull is None:
+            self._send(404, {"message": "Not Found"})
+        return pull
+
+    def _pull(self, query, full_name: str, number: str):
+        if not (pull := self._pull_request(full_name, number)):
+            return
+
+        if "diff" in self.headers.get("Accept", ""):
+            diff = self.github.diff(full_name, pull.base, pull.head)
+            return self._send(200, diff.encode(), "text/plain; charset=utf-8")
+
+        self._send(
+            200,
+            {
+                "number": pull.number,
+                "title": pull.title,
+                "head": {"sha": pull.head},
+                "base": {"sha": pull.base},
+            },
+        )
+
+    def _files(self, query, full_name: str, number: str):
+        if not (pull := self._pull_request(full_name, number)):
+            return
+
+        files = _split_files(self.github.diff(full_name, pull.base, pull.head))
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        pages = max(1, -(-len(files) // per_page))
+        body = orjson.dumps(files[(page - 1) * per_page : page * per_page])
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", headers={"ETag": etag})
+
+        base = f"http://{self.headers['Host']}{urlsplit(self.path).path}"
+        links = [f'<{base}?per_page={per_page}&page={pages}>; rel="last"']
+        if page < pages:
+            links.insert(0, f'<{base}?per_page={per_page}&page={page + 1}>; rel="next"')
+        self._send(200, body, headers={"ETag": etag, "Link": ", ".join(links)})
+
+    def _compare(self, query, full_name: str, base: str, head: str):
+        try:
+            if "diff" not in self.headers.get("Accept", ""):
+                return self._send(
+                    200, {"status": self.github.compare_status(full_name, base, head)}
+                )
+            diff = self.github.diff(full_name, base, head)
+        except subprocess.CalledProcessError:
+            return self._send(404, {"message": "Not Found"})
+        self._send(200, diff.encode(), "text/plain; charset=utf-8")
+
+    def _git_backend(self, method: str, url):
+        # CGI over git's own smart HTTP server.
+        env = {
+            "PATH": os.environ.get("PATH", ""),
+            "GIT_PROJECT_ROOT": self.github.git_root,
+            "GIT_HTTP_EXPORT_ALL": "1",
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "GIT_PROTOCOL": self.headers.get("Git-Protocol", ""),
+            "HTTP_CONTENT_ENCODING": self.headers.get("Content-Encoding", ""),
+            "REMOTE_ADDR": self.client_address[0],
+        }
+        out = subprocess.run(
+            ["git", "http-backend"],
+            input=self._read_body(),
+            env=env,
+            capture_output=True,
+        ).stdout
+
+        head, _, body = out.partition(b"\r\n\r\n")
+        status, headers = 200, {}
+        for line in head.decode().splitlines():
+            key, _, value = line.partition(":")
+            if key.lower() == "status":
+                status = int(value.split()[0])
+            else:
+                headers[key] = value.strip()
+
+        content_type = headers.pop("Content-Type", "application/octet-stream")
+        self._send(status, body, content_type, headers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--repos", type=int, default=2)
+    parser.add_argument("--prs", type=int, default=5)
+    parser.add_argument("--pushes", type=int, default=1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="fake-github-")
+    pulls = build_scenario(root, args.repos, args.prs, args.pushes)
+    github = FakeGitHub(root, pulls)
+    url = github.start(port=args.port)
+
+    print(f"Serving {len(pulls)} pull requests from {root} at {url}")
+    for pull in pulls:
+        print(f"  {pull.full_name}#{pull.number} {pull.base[:7]}..{pull.head[:7]}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        github.stop()
+
+
+if __name__ == "__main__":
+    main()
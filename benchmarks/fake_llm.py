@@ -0,0 +1,103 @@
+"""A deterministic stand-in for the Groq chat model, for load tests.
+
+Point the workers at it with LLM_FACTORY=fake_llm:make_llm (with benchmarks/ on
+PYTHONPATH). Every call sleeps FAKE_LLM_LATENCY seconds, give or take
+FAKE_LLM_JITTER, then answers with suggestions derived from the prompt's hunk
+headers, so the same prompt always gets the same answer.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+FILE_RE = re.compile(r"^\+\+\+ b/(.+)$", re.MULTILINE)
+HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+CHARS_PER_TOKEN = 4
+
+
+class FakeChatModel:
+    # Only implements what the review agent uses: with_structured_output()
+    # and the runnable it returns.
+    def __init__(self, latency: float = 2.0, jitter: float = 0.5, every: int = 3):
+        self.latency = latency
+        self.jitter = jitter
+        # One suggestion per `every` hunks.
+        self.every = every
+
+    def with_structured_output(self, schema, include_raw: bool = False):
+        def respond(prompt):
+            text = prompt.to_string()
+            time.sleep(self._delay(text))
+            return self._respond(schema, text, include_raw)
+
+        async def arespond(prompt):
+            text = prompt.to_string()
+            await asyncio.sleep(self._delay(text))
+            return self._respond(schema, text, include_raw)
+
+        return RunnableLambda(respond, afunc=arespond)
+
+    def _digest(self, text: str) -> bytes:
+        return hashlib.sha256(text.encode()).digest()
+
+    def _delay(self, prompt: str) -> float:
+        # Jitter is derived from the prompt too, so runs are repeatable.
+        spread = self._digest(prompt)[0] / 255 * 2 - 1
+        return max(0.0, self.latency + spread * self.jitter)
+
+    def _suggestions(self, prompt: str) -> list:
+        suggestions = []
+        # Each file section starts at its "+++ b/" line.
+        sections = FILE_RE.split(prompt)[1:]
+
+        for path, body in zip(sections[::2], sections[1::2]):
+            for m in HUNK_RE.finditer(body):
+                digest = self._digest(f"{path}:{m.group(0)}")
+                if digest[0] % self.every:
+                    continue
+
+                line = int(m.group(1))
+                suggestions.append(
+                    {
+                        "id": f"fake-{digest.hex()[:12]}",
+                        "file": path,
+                        "start_line": max(line, 1),
+                        "end_line": max(line, 1),
+                        "patch": "",
+                        "auto_fixable": False,
+                        "confidence": round(digest[1] / 255, 2),
+                        "explain": "Synthetic suggestion from the fake model.",
+                    }
+                )
+
+        return suggestions
+
+    def _respond(self, schema, prompt: str, include_raw: bool):
+        suggestions = self._suggestions(prompt)
+        parsed = schema(suggestions=suggestions)
+
+        if not include_raw:
+            return parsed
+
+        input_tokens = len(prompt) // CHARS_PER_TOKEN
+        output_tokens = 60 * len(suggestions) + 10
+        raw = AIMessage(
+            content="",
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+
+def make_llm() -> FakeChatModel:
+    return FakeChatModel(
+        latency=float(os.environ.get("FAKE_LLM_LATENCY", "2.0")),
+        jitter=float(os.environ.get("FAKE_LLM_JITTER", "0.5")),
+    )
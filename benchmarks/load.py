@@ -0,0 +1,431 @@
+"""Load-test the whole review pipeline, offline.
+
+    uv run python benchmarks/load.py [--repos 4] [--prs 10] [--pushes 1]
+        [--rate 2] [--llm-latency 2] [--worker-processes 2] [--flush-redis]
+
+Needs a local Redis and a migrated Postgres, taken from REDIS_URL and
+DATABASE_CONNECTION_MAIN. Everything else runs locally:
+- fake_github.py builds the repositories and PRs and serves them;
+- the API, the RQ workers and the LLM worker are started as usual, with the
+  chat model swapped for fake_llm.py;
+- signed pull_request webhooks are replayed at --rate per second, and queue
+  depths are sampled every second until the pipelines drain.
+
+Reports reviews per minute, per-stage and end-to-end latency percentiles, and
+queue depth over time. Use a scratch Redis database; --flush-redis empties it
+first so cached reviews from an earlier run don't flatter the numbers.
+"""
+
+import argparse
+import hashlib
+import hmac
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import httpx
+import orjson
+from redis import Redis
+from rq import Queue
+from rq.job import Job
+from rq.registry import (
+    DeferredJobRegistry,
+    FailedJobRegistry,
+    FinishedJobRegistry,
+    StartedJobRegistry,
+)
+from fake_github import INSTALLATION_ID, FakeGitHub, PullRequest, build_scenario
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "src")
+QUEUES = ["default", "llm"]
+
+STAGES = {
+    "start_revew_agent": "start",
+    "run_static_checks": "static",
+    "run_llm_review": "llm",
+    "finalize_review": "finalize",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _private_key() -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+def _seed_repos(pulls: List[PullRequest], secret: str):
+    from multi_agent_reviewer.db import session
+    from multi_agent_reviewer.models.Repo import Repo
+
+    # The webhook handler looks repositories up by their bare name.
+    names = sorted({p.repo for p in pulls})
+    session.query(Repo).filter(Repo.repo_name.in_(names)).delete()
+    session.add_all(
+        Repo(
+            repo_name=name,
+            owner=pulls[0].owner,
+            installation_id=INSTALLATION_ID,
+            webhook_secret=secret,
+        )
+        for name in names
+    )
+    session.commit()
+    session.close()
+
+
+def _start(name: str, args: List[str], env: dict, log_dir: str) -> subprocess.Popen:
+    log = open(os.path.join(log_dir, f"{name}.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", *args],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+
+
+def _stop(processes: List[subprocess.Popen]):
+    for p in processes:
+        if p.poll() is None:
+            p.send_signal(signal.SIGTERM)
+    for p in processes:
+        try:
+            p.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(p.pid, signal.SIGKILL)
+
+
+def _wait_http(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} didn't come up within {timeout}s")
+
+
+def _delivery(pull: PullRequest, push: int) -> dict:
+    return {
+        "action": "opened" if push == 0 else "synchronize",
+        "number": pull.number,
+        "repository": {
+            "name": pull.repo,
+            "full_name": pull.full_name,
+            "owner": {"login": pull.owner},
+        },
+        "pull_request": {
+            "number": pull.number,
+            "title": pull.title,
+            "head": {"sha": pull.heads[push]},
+            "base": {"sha": pull.base},
+        },
+        "installation": {"id": INSTALLATION_ID},
+    }
+
+
+def replay(
+    api_url: str, pulls: List[PullRequest], pushes: int, rate: float, secret: str
+) -> List[dict]:
+    # Sends every PR's first push, then every PR's second push, and so on,
+    # paced at `rate` deliveries per second whatever the API's latency.
+    sent: List[dict] = []
+    client = httpx.Client(base_url=api_url, timeout=30)
+    schedule = [(pull, push) for push in range(pushes) for pull in pulls]
+    started = time.monotonic()
+
+    def send(pull: PullRequest, push: int):
+        # The PR's diff moves to the new head as its push is announced.
+        pull.head = pull.heads[push]
+        body = orjson.dumps(_delivery(pull, push))
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        before = time.monotonic()
+        response = client.post(
+            "/review-webhook",
+            content=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-GitHub-Event": "pull_request",
+                "X-GitHub-Delivery": str(uuid.uuid4()),
+                "X-Hub-Signature-256": f"sha256={signature}",
+            },
+        )
+        sent.append(
+            {"status": response.status_code, "latency": time.monotonic() - before}
+        )
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        for i, (pull, push) in enumerate(schedule):
+            delay = started + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, pull, push)
+
+    client.close()
+    return sent
+
+
+class Sampler(threading.Thread):
+    # Records queue depths every `interval` seconds, and the timings of every
+    # job as it finishes, before RQ's result TTL expires it.
+
+    def __init__(self, redis: Redis, interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.redis = redis
+        self.interval = interval
+        self.queues = [Queue(name, connection=redis) for name in QUEUES]
+        self.samples: List[dict] = []
+        self.jobs: Dict[str, dict] = {}
+        self.started = time.monotonic()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+    def sample(self):
+        sample = {"t": time.monotonic() - self.started}
+        busy = 0
+
+        for queue in self.queues:
+            sample[queue.name] = queue.count
+            running = StartedJobRegistry(queue=queue).count
+            deferred = DeferredJobRegistry(queue=queue).count
+            sample[f"{queue.name}:running"] = running
+            busy += queue.count + running + deferred
+
+            for registry, status in (
+                (FinishedJobRegistry(queue=queue), "finished"),
+                (FailedJobRegistry(queue=queue), "failed"),
+            ):
+                new = [i for i in registry.get_job_ids() if i not in self.jobs]
+                for job in Job.fetch_many(new, connection=self.redis):
+                    if job is not None:
+                        self.jobs[job.id] = self._record(job, status)
+
+        sample["busy"] = busy
+        self.samples.append(sample)
+
+    @staticmethod
+    def _record(job: Job, status: str) -> dict:
+        stage = STAGES.get(job.func_name.rsplit(".", 1)[-1], job.func_name)
+        record = {
+            "stage": stage,
+            "status": status,
+            "enqueued_at": job.enqueued_at.timestamp(),
+            "started_at": job.started_at.timestamp() if job.started_at else None,
+            "ended_at": job.ended_at.timestamp() if job.ended_at else None,
+        }
+
+        if stage == "start" and status == "finished":
+            result = job.return_value() or {}
+            record["task_id"] = result.get("task_id")
+        if stage == "finalize":
+            record["task_id"] = job.args[0]
+
+        return record
+
+    def drained(self, checks: int = 3) -> bool:
+        recent = self.samples[-checks:]
+        return len(recent) == checks and all(s["busy"] == 0 for s in recent)
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "-"
+    values = sorted(values)
+
+    def at(p: float) -> float:
+        return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+    return f"{at(50):7.3f} {at(90):7.3f} {at(99):7.3f} {values[-1]:7.3f}"
+
+
+def report(sampler: Sampler, sent: List[dict], github: FakeGitHub):
+    jobs = list(sampler.jobs.values())
+    ok = sum(1 for s in sent if s["status"] < 300)
+    print(f"\nwebhooks: {len(sent)} sent, {ok} accepted")
+    print(f"{'':<24} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7}  (seconds)")
+    print(f"{'webhook response':<24} {percentiles([s['latency'] for s in sent])}")
+
+    for stage in STAGES.values():
+        done = [j for j in jobs if j["stage"] == stage and j["started_at"]]
+        failed = sum(1 for j in jobs if j["stage"] == stage and j["status"] == "failed")
+        waits = [j["started_at"] - j["enqueued_at"] for j in done]
+        runs = [j["ended_at"] - j["started_at"] for j in done if j["ended_at"]]
+        print(f"{stage + ' queued':<24} {percentiles(waits)}")
+        print(f"{stage + ' running':<24} {percentiles(runs)}  {failed} failed")
+
+    starts = {
+        j["task_id"]: j
+        for j in jobs
+        if j["stage"] == "start" and j.get("task_id") is not None
+    }
+    reviews = [
+        (starts[j["task_id"]], j)
+        for j in jobs
+        if j["stage"] == "finalize"
+        and j["status"] == "finished"
+        and j["task_id"] in starts
+    ]
+    print(
+        f"{'end to end':<24} "
+        f"{percentiles([f['ended_at'] - s['enqueued_at'] for s, f in reviews])}"
+    )
+
+    if reviews:
+        first = min(j["enqueued_at"] for j in starts.values())
+        last = max(f["ended_at"] for _, f in reviews)
+        per_minute = len(reviews) / max(last - first, 1e-9) * 60
+        print(
+            f"\nthroughput: {len(reviews)} reviews in {last - first:.1f}s, "
+            f"{per_minute:.1f} reviews/min"
+        )
+
+    print("\nqueue depth (queued/running):")
+    step = max(1, len(sampler.samples) // 20)
+    for s in sampler.samples[::step]:
+        depths = "  ".join(f"{q} {s[q]:>4}/{s[q + ':running']:<3}" for q in QUEUES)
+        print(f"  {s['t']:7.1f}s  {depths}")
+
+    print(f"\nfake GitHub requests: {dict(github.requests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repos", type=int, default=4)
+    parser.add_argument("--prs", type=int, default=10, help="per repository")
+    parser.add_argument("--pushes", type=int, default=1, help="per PR")
+    parser.add_argument("--files", type=int, default=20, help="per repository")
+    parser.add_argument("--changed", type=int, default=4, help="files per push")
+    parser.add_argument("--rate", type=float, default=2, help="webhooks per second")
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--worker-processes", type=int, default=2)
+    parser.add_argument("--llm-concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=600, help="to drain")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--flush-redis", action="store_true")
+    parser.add_argument("--json", help="write the raw samples and jobs here")
+    args = parser.parse_args()
+
+    for name in ("REDIS_URL", "DATABASE_CONNECTION_MAIN"):
+        if not os.environ.get(name):
+            sys.exit(f"{name} must point at a local scratch instance")
+
+    redis = Redis.from_url(os.environ["REDIS_URL"])
+    if args.flush_redis:
+        redis.flushdb()
+
+    root = tempfile.mkdtemp(prefix="review-load-")
+    print(f"Building scenario in {root}...")
+    pulls = build_scenario(
+        root,
+        args.repos,
+        args.prs,
+        args.pushes,
+        files=args.files,
+        changed=args.changed,
+        seed=args.seed,
+    )
+    github = FakeGitHub(root, pulls)
+    github_url = github.start()
+
+    secret = uuid.uuid4().hex
+    _seed_repos(pulls, secret)
+
+    api_port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            [SRC_DIR, BENCHMARKS_DIR, os.environ.get("PYTHONPATH", "")]
+        ),
+        "GITHUB_API_URL": github_url,
+        "GITHUB_GIT_URL": github_url,
+        "GITHUB_APP_ID": "1",
+        "GITHUB_APP_PRIVATE_KEY": _private_key(),
+        "GITHUB_APP_SECRET": secret,
+        "MIRROR_CACHE_DIR": os.path.join(root, "mirrors"),
+        "ARTIFACT_DIR": os.path.join(root, "artifacts"),
+        "LLM_FACTORY": "fake_llm:make_llm",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "WORKER_PROCESSES": str(args.worker_processes),
+        "LLM_WORKER_CONCURRENCY": str(args.llm_concurrency),
+    }
+    processes = [
+        _start(
+            "api",
+            ["uvicorn", "multi_agent_reviewer.main:app", "--port", str(api_port)],
+            env,
+            root,
+        ),
+        _start("worker", ["multi_agent_reviewer.workers.rq_worker"], env, root),
+        _start("llm_worker", ["multi_agent_reviewer.workers.llm_worker"], env, root),
+    ]
+    print(f"Logs in {root}/*.log")
+
+    api_url = f"http://127.0.0.1:{api_port}"
+    sampler = Sampler(redis)
+
+    try:
+        _wait_http(f"{api_url}/oauth")
+        sampler.start()
+        print(
+            f"Replaying {len(pulls) * args.pushes} webhooks at {args.rate}/s "
+            f"against {len(pulls)} PRs..."
+        )
+        sent = replay(api_url, pulls, args.pushes, args.rate, secret)
+
+        deadline = time.monotonic() + args.timeout
+        while not sampler.drained() and time.monotonic() < deadline:
+            time.sleep(1)
+        if not sampler.drained():
+            print(f"Pipelines didn't drain within {args.timeout:.0f}s")
+        sampler.stop()
+    finally:
+        _stop(processes)
+        github.stop()
+
+    report(sampler, sent, github)
+
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {
+                        "samples": sampler.samples,
+                        "jobs": sampler.jobs,
+                        "webhooks": sent,
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Measure how fast a new API process starts, and fail when it regresses.
+
+    uv run python benchmarks/startup.py [--runs 5] [--import-budget-ms 1000]
+                                        [--start-budget-ms 2500]
+
+Each run uses a fresh interpreter. "import" is the time to import the app
+module; "cold start" is the time from launching uvicorn to its first answered
+request. Exits non-zero if either median is over budget, or if importing the
+app loads a module that only the workers need.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+APP_MODULE = "multi_agent_reviewer.main"
+
+# Worker-side dependencies the webhook process must not pay for at startup.
+FORBIDDEN_MODULES = [
+    "rq",
+    "psycopg2",
+    "asyncpg",
+    "langchain_core",
+    "langchain_groq",
+    "git",
+    "multi_agent_reviewer.services.start_review_agent",
+    "multi_agent_reviewer.utils.github_utils",
+]
+
+IMPORT_SCRIPT = f"""
+import sys, time
+started = time.perf_counter()
+import {APP_MODULE}
+elapsed = time.perf_counter() - started
+forbidden = [m for m in {FORBIDDEN_MODULES!r} if m in sys.modules]
+print(elapsed * 1000, ",".join(forbidden))
+"""
+
+
+def measure_import() -> tuple[float, list[str]]:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(out[0]), out[1].split(",") if len(out) > 1 else []
+
+
+def heaviest_imports(n: int) -> list[tuple[int, str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {APP_MODULE}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    top_level = []
+
+    for line in stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        # Only modules imported directly by the app, not their dependencies.
+        if name.startswith("   ") and not name.startswith("    "):
+            top_level.append((int(cumulative), name.strip()))
+
+    return sorted(top_level, reverse=True)[:n]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_cold_start(timeout: float = 30) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            f"{APP_MODULE}:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+    )
+
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/oauth", timeout=1)
+                return (time.perf_counter() - started) * 1000
+            except httpx.TransportError:
+                time.sleep(0.01)
+        raise RuntimeError(f"uvicorn didn't answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1000)
+    parser.add_argument("--start-budget-ms", type=float, default=2500)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    # The app must import without any service configured.
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("DATABASE_CONNECTION_MAIN", None)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    import_ms = statistics.median(ms for ms, _ in imports)
+    forbidden = imports[0][1]
+    start_ms = statistics.median(measure_cold_start() for _ in range(args.runs))
+
+    print(f"{'import ' + APP_MODULE:<40} {import_ms:>8.0f} ms (median of {args.runs})")
+    print(
+        f"{'cold start to first request':<40} {start_ms:>8.0f} ms (median of {args.runs})"
+    )
+    print("heaviest imports:")
+    for us, name in heaviest_imports(args.top):
+        print(f"  {name:<38} {us / 1000:>8.0f} ms")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(
+            f"import took {import_ms:.0f} ms > {args.import_budget_ms:.0f} ms"
+        )
+    if start_ms > args.start_budget_ms:
+        failures.append(
+            f"cold start took {start_ms:.0f} ms > {args.start_budget_ms:.0f} ms"
+        )
+    if forbidden:
+        failures.append(f"importing the app loaded {', '.join(forbidden)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import List, Literal
+import os
+import tempfile
 
 
 class Settings(BaseSettings):
@@ -17,6 +20,170 @@ class Settings(BaseSettings):
     )
     github_app_id: str = Field(default="", validation_alias="GITHUB_APP_ID")
 
+    db_pool_size: int = Field(default=10, validation_alias="DATABASE_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, validation_alias="DATABASE_MAX_OVERFLOW")
+    db_pool_timeout: int = Field(default=5, validation_alias="DATABASE_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=1800, validation_alias="DATABASE_POOL_RECYCLE")
+
+    repo_cache_ttl: int = Field(default=300, validation_alias="REPO_CACHE_TTL")
+    repo_cache_max_size: int = Field(
+        default=4096, validation_alias="REPO_CACHE_MAX_SIZE"
+    )
+
+    webhook_delivery_ttl: int = Field(
+        default=24 * 60 * 60, validation_alias="WEBHOOK_DELIVERY_TTL"
+    )
+    webhook_pr_dedupe_ttl: int = Field(
+        default=10 * 60, validation_alias="WEBHOOK_PR_DEDUPE_TTL"
+    )
+
+    # How long a task's progress events stay replayable, and how many of the
+    # latest are kept.
+    task_events_ttl: int = Field(
+        default=24 * 60 * 60, validation_alias="TASK_EVENTS_TTL"
+    )
+    task_events_max: int = Field(default=1000, validation_alias="TASK_EVENTS_MAX")
+    task_events_keepalive: float = Field(
+        default=15, validation_alias="TASK_EVENTS_KEEPALIVE"
+    )
+
+    mirror_cache_dir: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "multi-agent-reviewer"),
+        validation_alias="MIRROR_CACHE_DIR",
+    )
+    mirror_cache_max_bytes: int = Field(
+        default=20 * 1024**3, validation_alias="MIRROR_CACHE_MAX_BYTES"
+    )
+
+    # Large job data (hunks, analyzer output) is stored here, zstd-compressed
+    # and keyed by content hash, and jobs and tasks only carry references.
+    # "local" needs a directory every worker shares; the default, under the
+    # temp dir, only suits a single host. "s3" takes any S3-compatible
+    # endpoint and needs boto3.
+    artifact_store: Literal["local", "s3"] = Field(
+        default="local", validation_alias="ARTIFACT_STORE"
+    )
+    artifact_dir: str = Field(
+        default=os.path.join(
+            tempfile.gettempdir(), "multi-agent-reviewer", "artifacts"
+        ),
+        validation_alias="ARTIFACT_DIR",
+    )
+    artifact_s3_bucket: str = Field(default="", validation_alias="ARTIFACT_S3_BUCKET")
+    artifact_s3_prefix: str = Field(
+        default="artifacts/", validation_alias="ARTIFACT_S3_PREFIX"
+    )
+    artifact_s3_endpoint_url: str = Field(
+        default="", validation_alias="ARTIFACT_S3_ENDPOINT_URL"
+    )
+    # Blobs not written or referenced again for this long are deleted: swept
+    # by the workers for "local", and by a lifecycle rule expiring objects
+    # under the prefix after as many days for "s3". Jobs only need theirs
+    # while they run; raw analyzer output in task results lasts this long.
+    artifact_ttl: int = Field(default=7 * 24 * 60 * 60, validation_alias="ARTIFACT_TTL")
+    artifact_zstd_level: int = Field(default=3, validation_alias="ARTIFACT_ZSTD_LEVEL")
+    # Values smaller than this, JSON-encoded, stay inline.
+    artifact_inline_max: int = Field(
+        default=4096, validation_alias="ARTIFACT_INLINE_MAX"
+    )
+
+    # Forked RQ worker processes, each replaced after WORKER_MAX_JOBS jobs
+    # (0 never) to bound leaks.
+    worker_processes: int = Field(default=2, validation_alias="WORKER_PROCESSES")
+    worker_max_jobs: int = Field(default=500, validation_alias="WORKER_MAX_JOBS")
+
+    # Per worker process.
+    analyzer_workers: int = Field(default=0, validation_alias="ANALYZER_WORKERS")
+    analyzer_timeout: float = Field(default=120, validation_alias="ANALYZER_TIMEOUT")
+    analyzer_output_cap: int = Field(
+        default=1024 * 1024, validation_alias="ANALYZER_OUTPUT_CAP"
+    )
+    default_analyzers: List[str] = Field(
+        default=["black", "flake8"], validation_alias="DEFAULT_ANALYZERS"
+    )
+    analyzer_cache_ttl: int = Field(
+        default=7 * 24 * 60 * 60, validation_alias="ANALYZER_CACHE_TTL"
+    )
+    # A count, not bytes: each entry is one file's findings, usually well
+    # under a KiB, so the default bounds the cache to roughly 200 MB.
+    analyzer_cache_max_entries: int = Field(
+        default=200_000, validation_alias="ANALYZER_CACHE_MAX_ENTRIES"
+    )
+
+    github_api_url: str = Field(
+        default="https://api.github.com", validation_alias="GITHUB_API_URL"
+    )
+    # Where repositories are cloned from.
+    github_git_url: str = Field(
+        default="https://github.com", validation_alias="GITHUB_GIT_URL"
+    )
+    github_max_connections: int = Field(
+        default=20, validation_alias="GITHUB_MAX_CONNECTIONS"
+    )
+    github_rate_reserve: int = Field(default=50, validation_alias="GITHUB_RATE_RESERVE")
+    github_rate_burst: int = Field(default=20, validation_alias="GITHUB_RATE_BURST")
+    # ~900 requests a minute, GitHub's secondary limit for REST endpoints.
+    github_min_interval: float = Field(
+        default=0.07, validation_alias="GITHUB_MIN_INTERVAL"
+    )
+    github_max_backoff: float = Field(default=60, validation_alias="GITHUB_MAX_BACKOFF")
+    github_max_retries: int = Field(default=3, validation_alias="GITHUB_MAX_RETRIES")
+    # "diff" streams the PR's raw diff; "files" uses the paginated files API,
+    # which omits patches for large files.
+    pr_diff_source: Literal["diff", "files"] = Field(
+        default="diff", validation_alias="PR_DIFF_SOURCE"
+    )
+    github_page_concurrency: int = Field(
+        default=8, validation_alias="GITHUB_PAGE_CONCURRENCY"
+    )
+    github_etag_ttl: int = Field(
+        default=24 * 60 * 60, validation_alias="GITHUB_ETAG_TTL"
+    )
+    github_etag_max_entries: int = Field(
+        default=50_000, validation_alias="GITHUB_ETAG_MAX_ENTRIES"
+    )
+
+    # How often a running stage checks whether a newer push superseded it.
+    stop_check_interval: float = Field(
+        default=2, validation_alias="STOP_CHECK_INTERVAL"
+    )
+    incremental_review: bool = Field(
+        default=True, validation_alias="INCREMENTAL_REVIEW"
+    )
+    llm_model: str = Field(default="gpt-4o-mini", validation_alias="LLM_MODEL")
+    # "module:function" returning the chat model to use instead of Groq, e.g. a
+    # stand-in for load tests.
+    llm_factory: str = Field(default="", validation_alias="LLM_FACTORY")
+    llm_cache_ttl: int = Field(
+        default=14 * 24 * 60 * 60, validation_alias="LLM_CACHE_TTL"
+    )
+    llm_cache_max_entries: int = Field(
+        default=500_000, validation_alias="LLM_CACHE_MAX_ENTRIES"
+    )
+    llm_batch_token_budget: int = Field(
+        default=6000, validation_alias="LLM_BATCH_TOKEN_BUDGET"
+    )
+    llm_max_concurrency: int = Field(default=4, validation_alias="LLM_MAX_CONCURRENCY")
+    llm_max_output_tokens: int = Field(
+        default=4000, validation_alias="LLM_MAX_OUTPUT_TOKENS"
+    )
+    # The account's per-model Groq limits, shared by every worker.
+    llm_rpm: int = Field(default=1000, validation_alias="LLM_RPM")
+    llm_tpm: int = Field(default=300_000, validation_alias="LLM_TPM")
+    # Reserved per call for the completion until the real usage is known.
+    llm_output_token_estimate: int = Field(
+        default=1000, validation_alias="LLM_OUTPUT_TOKEN_ESTIMATE"
+    )
+    # Whether workers/llm_worker.py serves the "llm" queue. Without it, the
+    # regular workers take LLM jobs too, one review per process at a time.
+    llm_dedicated_worker: bool = Field(
+        default=False, validation_alias="LLM_DEDICATED_WORKER"
+    )
+    # Reviews one LLM worker process runs at once.
+    llm_worker_concurrency: int = Field(
+        default=32, validation_alias="LLM_WORKER_CONCURRENCY"
+    )
+
     model_config = SettingsConfigDict(
         env_file=".env.local",
         env_file_encoding="utf-8",
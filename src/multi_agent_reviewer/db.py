@@ -1,11 +1,72 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from .config import settings
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from typing import AsyncIterator
+
+
+def _async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _create_engine():
+    return create_engine(
+        url=settings.database_url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+# The API process talks to Postgres through its own async pool so a slow query
+# never blocks the event loop. Workers keep using the sync session.
+def _create_async_engine():
+    return create_async_engine(
+        url=_async_database_url(settings.database_url),
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+def _build(name: str):
+    if name == "engine":
+        return _create_engine()
+    if name == "Session":
+        return sessionmaker(bind=_get("engine"))
+    if name == "session":
+        return _get("Session")()
+    if name == "async_engine":
+        return _create_async_engine()
+    if name == "AsyncSessionLocal":
+        return async_sessionmaker(bind=_get("async_engine"), expire_on_commit=False)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get(name: str):
+    if name not in globals():
+        globals()[name] = _build(name)
+    return globals()[name]
+
+
+def __getattr__(name: str):
+    # Engines, and the driver each one imports, are only built by the process
+    # that uses them: the API never loads psycopg2, workers never load asyncpg.
+    return _get(name)
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with _get("AsyncSessionLocal")() as async_session:
+        yield async_session
 
-engine = create_engine(url=settings.database_url, echo=True)
-Session = sessionmaker(bind=engine)
-session = Session()
 
 class Base(DeclarativeBase):
     pass
-
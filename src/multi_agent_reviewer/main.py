@@ -1,19 +1,85 @@
-from fastapi import FastAPI, Request, Header, HTTPException
-from rq import Queue, Retry
-from redis import Redis
-import json, hmac, hashlib
+from fastapi import FastAPI, Request, Header, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from redis import asyncio as aioredis
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import NamedTuple
+import base64
+import binascii
+import hmac, hashlib
+import orjson
 import logging
 from .config import settings
-from .db import session
+from .db import get_async_session
 from .models.Repo import Repo
-from .services.start_review_agent import start_revew_agent
+from .models.Task import Task, TaskStatus
+from .utils import metrics, task_events
+from .utils.cache import TTLCache
 
 logger = logging.getLogger(name=__name__)
-redis = Redis.from_url(settings.redis_url, decode_responses=True)
-queue = Queue("default", connection=redis)
+
+DELIVERY_PREFIX = "webhook:delivery"
+PR_DEDUPE_PREFIX = "webhook:pr"
 
 app = FastAPI()
 
+# Clients are made on first use, and rq is only imported by the enqueue path,
+# so a new API process starts serving as soon as the app is imported.
+_async_redis: aioredis.Redis | None = None
+_queue = None
+
+
+def get_async_redis() -> aioredis.Redis:
+    global _async_redis
+
+    if _async_redis is None:
+        _async_redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+
+    return _async_redis
+
+
+def get_queue():
+    global _queue
+
+    if _queue is None:
+        from redis import Redis
+        from rq import Queue
+
+        redis = Redis.from_url(settings.redis_url, decode_responses=True)
+        _queue = Queue("default", connection=redis)
+
+    return _queue
+
+
+class RepoInfo(NamedTuple):
+    webhook_secret: str | None
+    installation_id: int | None
+
+
+# Unknown repos are cached as None too, so bursts for unregistered repos don't
+# reach Postgres either. Installation events invalidate the affected entries.
+repo_cache = TTLCache(ttl=settings.repo_cache_ttl, maxsize=settings.repo_cache_max_size)
+_MISSING = object()
+
+
+async def get_repo_info(session: AsyncSession, repo_name: str) -> RepoInfo | None:
+    cached = repo_cache.get(repo_name, _MISSING)
+
+    if cached is not _MISSING:
+        return cached
+
+    result = await session.execute(
+        select(Repo.webhook_secret, Repo.installation_id).where(
+            Repo.repo_name == repo_name
+        )
+    )
+    row = result.first()
+    info = RepoInfo(row.webhook_secret, row.installation_id) if row else None
+    repo_cache.set(repo_name, info)
+    return info
+
 
 def verify_signature(secret: str, body: bytes, hub_signature: str | None) -> bool:
     if not hub_signature:
@@ -26,14 +92,124 @@ def verify_signature(secret: str, body: bytes, hub_signature: str | None) -> boo
     return hmac.compare_digest(max.hexdigest(), signature)
 
 
-@app.post("/review-webhook")
+async def _claim(key: str, ttl: int) -> bool:
+    return bool(await get_async_redis().set(key, 1, nx=True, ex=ttl))
+
+
+async def _handle_installation(session: AsyncSession, payload: dict):
+    action = payload.get("action")
+    installation = payload.get("installation", {})
+    installation_id = installation.get("id")
+
+    if action in ("created", "replaced"):
+        repos = payload.get("repositories", [])
+
+        for r in repos:
+            repo_name = r["full_name"]
+            owner = r["owner"]["login"]
+
+            result = await session.execute(
+                select(Repo).where(Repo.repo_name == repo_name, Repo.owner == owner)
+            )
+            record = result.scalars().first()
+
+            if not record:
+                record = Repo(
+                    repo_name=repo_name,
+                    installation_id=installation_id,
+                    owner=owner,
+                )
+                session.add(record)
+                logger.info(f"Added new repo record for {repo_name}")
+            else:
+                record.installation_id = installation_id
+                logger.info(f"Updated installation_id for repo {repo_name}")
+
+        await session.commit()
+        repo_cache.invalidate(
+            *(r["name"] for r in repos), *(r["full_name"] for r in repos)
+        )
+
+    elif action == "deleted":
+        await session.execute(
+            update(Repo)
+            .where(Repo.installation_id == installation_id)
+            .values(installation_id=None)
+        )
+        await session.commit()
+        repo_cache.clear()
+
+
+async def _handle_pull_request(payload: dict, repo_record: RepoInfo | None):
+    from rq import Retry
+    from .utils.review_state import LATEST_TTL, latest_key
+
+    repo = payload.get("repository", {})
+    pr = payload.get("pull_request", {})
+    head_sha = pr.get("head", {}).get("sha")
+    action = payload.get("action")
+
+    if action not in ("opened", "synchronize", "reopened"):
+        return
+
+    owner = repo["owner"]["login"]
+    repo = repo["full_name"]
+    pr_number = pr.get("number")
+    pr_title = pr.get("title", "")
+
+    # Separate deliveries can still describe the same push (e.g. several
+    # synchronize events for one head), so dedupe on the commit as well.
+    pr_key = f"{PR_DEDUPE_PREFIX}:{repo}:{pr_number}:{head_sha}"
+
+    if not await _claim(pr_key, settings.webhook_pr_dedupe_ttl):
+        logger.info(f"Review for {repo} PR #{pr_number} at {head_sha} already queued")
+        return
+
+    # Record the newest head before enqueueing so jobs for older pushes of this
+    # PR can tell they are obsolete and stop early.
+    await get_async_redis().set(
+        latest_key(owner, repo, pr_number), head_sha, ex=LATEST_TTL
+    )
+
+    install_id = repo_record.installation_id if repo_record else None
+    payload_for_job = {
+        "owner": owner,
+        "repo": repo,
+        "pr": pr_number,
+        "installation_id": install_id,
+        "pr_title": pr_title,
+        "head_sha": head_sha,
+    }
+
+    try:
+        await run_in_threadpool(
+            get_queue().enqueue,
+            "multi_agent_reviewer.services.start_review_agent.start_revew_agent",
+            payload_for_job,
+            timeout=10 * 60,
+            retry=Retry(max=3),
+        )
+    except Exception:
+        await get_async_redis().delete(pr_key)
+        raise
+
+    logger.info(f"Enqueuing review job for PR #{pr_number} in repo {repo}")
+
+
+@app.post("/review-webhook", status_code=202)
 async def review(
     request: Request,
     x_github_event: str | None = Header(default=None),
+    x_github_delivery: str | None = Header(default=None),
     x_hub_signature_256: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_async_session),
 ):
     body = await request.body()
-    payload = await request.json()
+
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
     repo = payload.get("repository", {})
     repo_name = repo.get("name", "")
@@ -41,8 +217,7 @@ async def review(
     repo_record = None
 
     if repo_name and repo_owner:
-        repo_record = session.query(Repo).filter(Repo.repo_name == repo_name).first()
-        session.close()
+        repo_record = await get_repo_info(session, repo_name)
 
     secret = (
         repo_record.webhook_secret
@@ -62,82 +237,226 @@ async def review(
         logger.warning("Invalid signature for incoming webhook")
         raise HTTPException(status_code=401, detail="Invalid signature")
 
+    # Only claim the delivery id once the signature checks out, otherwise an
+    # unsigned request could block the real delivery.
+    delivery_key = f"{DELIVERY_PREFIX}:{x_github_delivery}"
+
+    if x_github_delivery and not await _claim(
+        delivery_key, settings.webhook_delivery_ttl
+    ):
+        logger.info(f"Ignoring duplicate delivery {x_github_delivery}")
+        return {"ok": True, "duplicate": True}
+
     event = x_github_event or payload.get("action")
 
-    if event == "installation":
-        logger.info(f"Received installation event for repo {repo_name}")
-        action = payload.get("action")
-        installation = payload.get("installation", {})
-        installation_id = installation.get("id")
+    try:
+        if event == "installation":
+            logger.info(f"Received installation event for repo {repo_name}")
+            await _handle_installation(session, payload)
 
-        if action in ("created", "replaced"):
-            repos = payload.get("repositories", [])
+        if event == "pull_request":
+            logger.info(f"Received pull_request event for repo {repo_name}")
+            await _handle_pull_request(payload, repo_record)
+    except Exception:
+        # Let GitHub's redelivery retry the event.
+        if x_github_delivery:
+            await get_async_redis().delete(delivery_key)
+        raise
 
-            for r in repos:
-                repo_name = r["full_name"]
-                owner = r["owner"]["login"]
+    return {"ok": True}
 
-                record = (
-                    session.query(Repo)
-                    .filter(Repo.repo_name == repo_name, Repo.owner == owner)
-                    .first()
-                )
 
-                if not record:
-                    record = Repo(
-                        repo_name=repo_name,
-                        installation_id=installation_id,
-                        owner=owner,
-                    )
-                    session.add(record)
-                    logger.info(f"Added new repo record for {repo_name}")
-                else:
-                    record.installation_id = installation_id
-                    logger.info(f"Updated installation_id for repo {repo_name}")
-
-            session.commit()
-            session.close()
-
-        elif action == "deleted":
-            repos = payload.get("repositories", [])
-            session.query(Repo).filter(Repo.installation_id == installation_id).update(
-                {"installation_id": None}
-            )
-            session.commit()
-            session.close()
-
-    if event == "pull_request":
-        logger.info(f"Received pull_request event for repo {repo_name}")
-        pr = payload.get("pull_request", {})
-        head_sha = (pr.get("head", {}).get("sha"),)
-        action = payload.get("action")
-
-        if action in ("opened", "synchronize", "reopened"):
-            owner = repo["owner"]["login"]
-            repo = repo["full_name"]
-            pr_number = pr.get("number")
-            pr_title = pr.get("title", "")
-
-            install_id = repo_record.installation_id if repo_record else None
-            payload_for_job = {
-                "owner": owner,
-                "repo": repo,
-                "pr": pr_number,
-                "installation_id": install_id,
-                "pr_title": pr_title,
-                "head_sha": head_sha,
-            }
-
-            review_agent = queue.enqueue(
-                "multi_agent_reviewer.services.start_review_agent.start_revew_agent",
-                payload_for_job,
-                timeout=10 * 60,
-                retry=Retry(max=3),
-            )
+# What task listings return. payload and result can be large, so they are
+# never read for a list.
+TASK_SUMMARY = (
+    Task.id,
+    Task.owner,
+    Task.repo,
+    Task.pr_number,
+    Task.head_sha,
+    Task.status,
+    Task.created_at,
+    Task.completed_at,
+)
+MAX_PAGE_SIZE = 200
 
-            logger.info(f"Enqueuing review job for PR #{pr_number} in repo {repo}")
 
-    return {"ok": True}
+def _summary(row) -> dict:
+    return {
+        "id": row.id,
+        "owner": row.owner,
+        "repo": row.repo,
+        "pr": row.pr_number,
+        "head_sha": row.head_sha,
+        "status": row.status.value,
+        "created_at": row.created_at,
+        "completed_at": row.completed_at,
+    }
+
+
+def _naive(value: datetime | None) -> datetime | None:
+    # Task times are stored as naive local times.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _encode_cursor(created_at: datetime, task_id: int) -> str:
+    return base64.urlsafe_b64encode(
+        orjson.dumps([created_at.isoformat(), task_id])
+    ).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, task_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/tasks")
+async def list_tasks(
+    owner: str | None = None,
+    repo: str | None = None,
+    pr: int | None = None,
+    status: TaskStatus | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Newest first. Pages are keyed on the last row's (created_at, id) rather
+    # than an offset, so each one is a single range scan of one of the task
+    # indexes however deep the client pages.
+    query = select(*TASK_SUMMARY)
+
+    if owner:
+        query = query.where(Task.owner == owner)
+    if repo:
+        # Tasks store the full name; a bare one needs the owner.
+        if owner and "/" not in repo:
+            repo = f"{owner}/{repo}"
+        query = query.where(Task.repo == repo)
+    if pr is not None:
+        query = query.where(Task.pr_number == pr)
+    if status:
+        query = query.where(Task.status == status)
+    if since:
+        query = query.where(Task.created_at >= _naive(since))
+    if until:
+        query = query.where(Task.created_at < _naive(until))
+    if cursor:
+        after = tuple_(*_decode_cursor(cursor))
+        query = query.where(tuple_(Task.created_at, Task.id) < after)
+
+    result = await session.execute(
+        query.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+    page = rows[:limit]
+
+    return {
+        "tasks": [_summary(row) for row in page],
+        "next_cursor": (
+            _encode_cursor(page[-1].created_at, page[-1].id)
+            if len(rows) > limit
+            else None
+        ),
+    }
+
+
+async def _task_snapshot(session: AsyncSession, task_id: int) -> dict:
+    # Tasks with recent progress are answered from Redis; Postgres is only
+    # asked about tasks whose events have expired.
+    state = await get_async_redis().hgetall(task_events.state_key(task_id))
+
+    if state:
+        return {
+            "id": task_id,
+            "owner": state.get("owner"),
+            "repo": state.get("repo"),
+            "pr": int(state["pr"]) if "pr" in state else None,
+            "head_sha": state.get("head_sha"),
+            "status": state.get("status"),
+            "stage": state.get("stage"),
+            "last_event_id": int(state["last_event_id"]),
+            "updated_at": float(state["updated_at"]),
+        }
+
+    result = await session.execute(select(*TASK_SUMMARY).where(Task.id == task_id))
+    row = result.first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return {
+        "id": task_id,
+        "owner": row.owner,
+        "repo": row.repo,
+        "pr": row.pr_number,
+        "head_sha": row.head_sha,
+        "status": row.status.value,
+        "stage": None,
+        "last_event_id": None,
+        "updated_at": (row.completed_at or row.created_at).timestamp(),
+    }
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: int, session: AsyncSession = Depends(get_async_session)):
+    return await _task_snapshot(session, task_id)
+
+
+@app.get("/tasks/{task_id}/events")
+async def get_task_events(
+    task_id: int,
+    last_event_id: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Server-Sent Events: the task's progress so far, then live updates until
+    # it completes, fails or is superseded. Reconnecting clients send
+    # Last-Event-ID and only get what they missed.
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    redis = get_async_redis()
+    last_id = int(last_event_id) if (last_event_id or "").isdigit() else 0
+    status, newest = await redis.hmget(
+        task_events.state_key(task_id), "status", "last_event_id"
+    )
+
+    if newest is None:
+        # Nothing left to follow; send where the task ended up.
+        snapshot = await _task_snapshot(session, task_id)
+        if last_event_id is not None and snapshot["status"] in task_events.TERMINAL:
+            return Response(status_code=204)
+
+        event = {"type": "status", "status": snapshot["status"]}
+        return StreamingResponse(
+            iter([task_events.format_sse(0, event)]),
+            media_type="text/event-stream",
+            headers=headers,
+        )
+
+    if status in task_events.TERMINAL and int(newest) <= last_id:
+        # EventSource reconnects on its own whenever a stream ends, including
+        # after the final event; 204 is what makes it stop.
+        return Response(status_code=204)
+
+    return StreamingResponse(
+        task_events.stream(redis, task_id, last_id),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Stage timings and sizes recorded by every worker, plus queue depths and
+    # job failures, all read from Redis.
+    return PlainTextResponse(
+        await metrics.collect(get_async_redis()), media_type=metrics.CONTENT_TYPE
+    )
 
 
 @app.get("/oauth")
@@ -1,7 +1,7 @@
 from ..db import Base
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import JSON, DateTime
+from sqlalchemy import JSON, DateTime, Index, String, func
 import enum
 
 
@@ -10,17 +10,28 @@ class TaskStatus(enum.Enum):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    SUPERSEDED = "SUPERSEDED"
 
 
 class Task(Base):
     __tablename__ = "task"
+    # Listings go newest first by (created_at, id); see GET /tasks.
+    __table_args__ = (
+        Index("ix_task_created", "created_at", "id"),
+        Index("ix_task_status_created", "status", "created_at", "id"),
+        Index("ix_task_repo_created", "owner", "repo", "created_at", "id"),
+        Index("ix_task_pr_created", "owner", "repo", "pr_number", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
     repo: Mapped[str] = mapped_column(nullable=False)
     pr_number: Mapped[int] = mapped_column(nullable=False)
     owner: Mapped[str] = mapped_column(nullable=False)
+    head_sha: Mapped[str] = mapped_column(String(40), nullable=True)
     status: Mapped[TaskStatus] = mapped_column(default=TaskStatus.PENDING)
     payload: Mapped[dict] = mapped_column(JSON)
     result: Mapped[dict] = mapped_column(JSON, nullable=True)
-    created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now())
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime, default=datetime.now, server_default=func.now()
+    )
     completed_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable, Dict, List, Tuple
+from redis import Redis
+from ..config import settings
+from ..utils.cache import RedisCache
+from ..utils.lint_utils import LINTER_CONFIG_FILES
+from .analyzer_engine import run_analyzers
+from .analyzers import REGISTRY, Analyzer
+
+logger = logging.getLogger(__name__)
+redis = Redis.from_url(settings.redis_url, decode_responses=True)
+
+caches = {
+    name: RedisCache(
+        redis,
+        f"analyzer:cache:{name}",
+        ttl=settings.analyzer_cache_ttl,
+        max_entries=settings.analyzer_cache_max_entries,
+    )
+    for name, analyzer in REGISTRY.items()
+    if analyzer.cacheable
+}
+
+
+def blob_sha(path: str) -> str:
+    # Same id git gives the file's blob, so unchanged content shares an entry
+    # across commits and branches.
+    with open(path, "rb") as f:
+        data = f.read()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def config_hash(root: str) -> str:
+    digest = hashlib.sha256()
+
+    for name in LINTER_CONFIG_FILES:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            digest.update(name.encode() + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()[:16]
+
+
+@lru_cache()
+def analyzer_version(name: str) -> str:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def analyze_files(
+    root: str,
+    files: List[str],
+    analyzers: List[Analyzer],
+    stop: Callable[[], bool] | None = None,
+) -> Tuple[Dict[str, dict], List[Dict]]:
+    # Returns the raw artifacts of the analyzers that actually ran and the
+    # per-file findings for every file, cached or fresh (not yet diff-scoped).
+    cfg = config_hash(root)
+    blobs = {f: blob_sha(os.path.join(root, f)) for f in files}
+    keys: Dict[str, Dict[str, str]] = {}
+    pending: Dict[str, List[str]] = {}
+    findings: List[Dict] = []
+
+    for analyzer in analyzers:
+        name = analyzer.name
+
+        if name not in caches:
+            pending[name] = list(files)
+            continue
+
+        # The path is part of the key: per-file-ignores, mypy module settings
+        # and the like make findings depend on where the content lives.
+        keys[name] = {
+            f: f"{analyzer_version(name)}:{cfg}:{blobs[f]}:{f}" for f in files
+        }
+        cached = caches[name].get_many(list(keys[name].values()))
+
+        for filename, hit in zip(files, cached):
+            if hit is None:
+                pending.setdefault(name, []).append(filename)
+            else:
+                findings.extend({**finding, "file": filename} for finding in hit)
+
+    logger.info(
+        f"Analyzer cache: {sum(map(len, pending.values()))} misses "
+        f"across {len(files)} files"
+    )
+
+    artifacts = run_analyzers(root, analyzers, pending, stop)
+
+    for name, filenames in pending.items():
+        result = artifacts[name]
+        fresh = REGISTRY[name].parse(result["stdout"])
+        findings.extend(fresh)
+
+        # Timeouts, truncated output and tool errors (exit codes other than
+        # 0/1) are not a faithful result for the file; don't cache them.
+        if name not in caches or result.get("truncated"):
+            continue
+        if result["returncode"] not in (0, 1):
+            continue
+
+        by_file = defaultdict(list)
+        for finding in fresh:
+            by_file[finding["file"]].append(finding)
+
+        caches[name].set_many({keys[name][f]: by_file[f] for f in filenames})
+
+    return artifacts, findings
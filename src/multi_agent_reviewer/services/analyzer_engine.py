@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Callable, Dict, List
+from ..config import settings
+from ..utils.metrics import ANALYZER_SECONDS
+
+if TYPE_CHECKING:
+    from .analyzers import Analyzer
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_pid: int | None = None
+
+
+class Stopped(Exception):
+    # Raised by run_analyzers when its `stop` callback asks it to give up.
+    pass
+
+
+def _warm_up():
+    # Runs once in every pool process so the import and plugin discovery cost
+    # is paid at startup instead of on the first job.
+    import black  # noqa: F401
+    from flake8.api import legacy
+    from flake8.main.options import JobsArgument
+
+    # Building a style guide imports pyflakes/pycodestyle and any plugins.
+    legacy.get_style_guide(jobs=JobsArgument("1"))
+
+
+def _noop(_: int) -> int:
+    return os.getpid()
+
+
+def pool_size() -> int:
+    return settings.analyzer_workers or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+
+    # A forked child can't use its parent's executor; give it its own.
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(
+            max_workers=pool_size(),
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_warm_up,
+        )
+        _pool_pid = os.getpid()
+
+    return _pool
+
+
+def warm_pool():
+    pool = get_pool()
+    list(pool.map(_noop, range(pool_size())))
+    logger.info(f"Analyzer pool warmed with {pool_size()} processes")
+
+
+def shutdown_pool(terminate: bool = False):
+    global _pool
+
+    if _pool is not None and _pool_pid == os.getpid():
+        # shutdown() lets running tasks finish; a hung one never does, so its
+        # process has to be killed to give the slot back.
+        processes = list((_pool._processes or {}).values()) if terminate else []
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+        for process in processes:
+            process.terminate()
+    _pool = None
+
+
+def recycle_pool():
+    logger.warning("Replacing the analyzer pool after a timeout")
+    shutdown_pool(terminate=True)
+    warm_pool()
+
+
+def _black_mode(root: str):
+    import black
+
+    config = {}
+    pyproject = os.path.join(root, "pyproject.toml")
+
+    if os.path.isfile(pyproject):
+        config = black.parse_pyproject_toml(pyproject)
+
+    return black.Mode(
+        target_versions={
+            black.TargetVersion[v.upper()] for v in config.get("target_version", [])
+        },
+        line_length=config.get("line_length", black.DEFAULT_LINE_LENGTH),
+        string_normalization=not config.get("skip_string_normalization", False),
+        magic_trailing_comma=not config.get("skip_magic_trailing_comma", False),
+        preview=config.get("preview", False),
+    )
+
+
+def run_black(root: str, files: List[str]) -> dict:
+    import black
+
+    mode = _black_mode(root)
+    diffs, messages, returncode = [], [], 0
+
+    for filename in files:
+        try:
+            # Unreadable or non-UTF-8 files are reported like any other file
+            # black can't format, instead of failing the whole shard.
+            with open(os.path.join(root, filename), encoding="utf-8") as f:
+                src = f.read()
+
+            dst = black.format_file_contents(src, fast=True, mode=mode)
+        except black.NothingChanged:
+            continue
+        except Exception as e:
+            messages.append(f"error: cannot format {filename}: {e}")
+            returncode = 123
+            continue
+
+        diffs.append(black.diff(src, dst, filename, filename))
+        messages.append(f"would reformat {filename}")
+        returncode = max(returncode, 1)
+
+    return {
+        "stdout": "".join(diffs),
+        "stderr": "\n".join(messages),
+        "returncode": returncode,
+    }
+
+
+def run_flake8(root: str, files: List[str]) -> dict:
+    from flake8.api import legacy
+    from flake8.formatting.default import Default
+    from flake8.main.options import JobsArgument
+
+    lines: List[str] = []
+
+    class _Collector(Default):
+        def write(self, line, source):
+            if line:
+                lines.append(line)
+
+    # flake8 discovers setup.cfg/.flake8/tox.ini relative to the cwd. Pool
+    # processes run one task at a time, so changing it here is safe.
+    os.chdir(root)
+    # Parallelism comes from sharding across the pool, not from flake8 itself.
+    style = legacy.get_style_guide(jobs=JobsArgument("1"))
+    style.init_report(_Collector)
+    report = style.check_files(files)
+
+    return {
+        "stdout": "".join(f"{line}\n" for line in lines),
+        "stderr": "",
+        "returncode": 1 if report.total_errors else 0,
+    }
+
+
+def _shard(files: List[str], shards: int) -> List[List[str]]:
+    return [files[i::shards] for i in range(shards) if files[i::shards]]
+
+
+def _merge(results: List[dict]) -> dict:
+    return {
+        "stdout": "".join(r["stdout"] for r in results),
+        "stderr": "\n".join(r["stderr"] for r in results if r["stderr"]),
+        "returncode": max((r["returncode"] for r in results), default=0),
+    }
+
+
+def _capped(result: dict, cap: int) -> dict:
+    if len(result["stdout"]) <= cap:
+        return result
+
+    # Cut at a line boundary so parsers never see half a finding.
+    cut = result["stdout"].rfind("\n", 0, cap) + 1
+    return {**result, "stdout": result["stdout"][:cut], "truncated": True}
+
+
+async def _read_capped(stream: asyncio.StreamReader, cap: int) -> str:
+    # Keep draining past the cap so a chatty tool never blocks on a full pipe.
+    buf = bytearray()
+    while chunk := await stream.read(64 * 1024):
+        if len(buf) < cap:
+            buf.extend(chunk[: cap - len(buf)])
+    return buf.decode("utf-8", errors="replace")
+
+
+async def _run_in_pool(analyzer: "Analyzer", root: str, files: List[str]) -> dict:
+    pool = get_pool()
+    futures = [
+        asyncio.wrap_future(pool.submit(analyzer.in_process, root, shard))
+        for shard in _shard(files, pool_size())
+    ]
+    return _merge(list(await asyncio.gather(*futures)))
+
+
+async def _run_subprocess(
+    analyzer: "Analyzer", root: str, files: List[str], cap: int
+) -> dict:
+    proc = await asyncio.create_subprocess_exec(
+        *analyzer.command,
+        *files,
+        cwd=root,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    try:
+        # cap + 1 so _capped can tell the output was cut.
+        stdout, stderr, returncode = await asyncio.gather(
+            _read_capped(proc.stdout, cap + 1),
+            _read_capped(proc.stderr, cap),
+            proc.wait(),
+        )
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    return {"stdout": stdout, "stderr": stderr, "returncode": returncode}
+
+
+async def _run_one(
+    analyzer: "Analyzer", root: str, files: List[str], timeout: float, cap: int
+) -> dict:
+    if analyzer.in_process is not None:
+        runner = _run_in_pool(analyzer, root, files)
+    else:
+        runner = _run_subprocess(analyzer, root, files, cap)
+
+    started = time.perf_counter()
+    outcome = "error"
+
+    try:
+        result = _capped(await asyncio.wait_for(runner, timeout), cap)
+        outcome = "ok"
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        # Pending pool shards are cancelled; one that is already running can't
+        # be interrupted, so run_analyzers replaces the pool afterwards.
+        logger.warning(f"Analyzer {analyzer.name} timed out after {timeout}s")
+        return {
+            "stdout": "",
+            "stderr": f"{analyzer.name} timed out after {timeout}s",
+            "returncode": -1,
+            "timed_out": True,
+        }
+    except FileNotFoundError:
+        outcome = "missing"
+        logger.warning(f"Analyzer {analyzer.name} is not installed on this worker")
+        return {
+            "stdout": "",
+            "stderr": f"{analyzer.name} is not installed",
+            "returncode": 127,
+        }
+    finally:
+        ANALYZER_SECONDS.observe(
+            time.perf_counter() - started, analyzer=analyzer.name, outcome=outcome
+        )
+
+
+async def _gather_until_stopped(runners: list, stop: Callable[[], bool] | None):
+    gathered = asyncio.gather(*runners)
+    if stop is None:
+        return await gathered
+
+    # Checked every few seconds rather than only up front, so a job whose
+    # push was superseded stops mid-run instead of linting to the end.
+    while True:
+        done, _ = await asyncio.wait({gathered}, timeout=settings.stop_check_interval)
+        if done:
+            return gathered.result()
+        if await asyncio.to_thread(stop):
+            gathered.cancel()
+            await asyncio.gather(gathered, return_exceptions=True)
+            raise Stopped()
+
+
+async def _run_all(
+    analyzers: List["Analyzer"],
+    root: str,
+    files_by_tool: Dict[str, List[str]],
+    timeout: float,
+    cap: int,
+    stop: Callable[[], bool] | None = None,
+) -> Dict[str, dict]:
+    empty = {"stdout": "", "stderr": "", "returncode": 0}
+    active = [a for a in analyzers if files_by_tool.get(a.name)]
+    results = await _gather_until_stopped(
+        [_run_one(a, root, files_by_tool[a.name], timeout, cap) for a in active],
+        stop,
+    )
+    merged = {a.name: dict(empty) for a in analyzers}
+    merged.update(zip((a.name for a in active), results))
+    return merged
+
+
+def run_analyzers(
+    root: str,
+    analyzers: List["Analyzer"],
+    files_by_tool: Dict[str, List[str]],
+    stop: Callable[[], bool] | None = None,
+) -> Dict[str, dict]:
+    # All selected analyzers run concurrently, each under its own timeout, so
+    # the stage takes as long as the slowest tool and a hung one only loses
+    # its own results. Raises Stopped once `stop()` returns True.
+    try:
+        results = asyncio.run(
+            _run_all(
+                analyzers,
+                root,
+                files_by_tool,
+                settings.analyzer_timeout,
+                settings.analyzer_output_cap,
+                stop,
+            )
+        )
+    except BrokenProcessPool:
+        # A crashed analyzer takes the pool down with it; start a fresh one for
+        # the next job and let RQ retry this one.
+        logger.error("Analyzer pool crashed, recreating it")
+        shutdown_pool()
+        raise
+
+    # Only once every analyzer is done, so killing a hung shard can't take
+    # down another analyzer's work in the same pool.
+    if any(a.in_process and results[a.name].get("timed_out") for a in analyzers):
+        recycle_pool()
+
+    return results
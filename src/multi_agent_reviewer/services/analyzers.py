@@ -0,0 +1,94 @@
+import logging
+import os
+import tomllib
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+from ..config import settings
+from ..utils.lint_utils import (
+    parse_black_diff,
+    parse_flake8_output,
+    parse_mypy_output,
+)
+from .analyzer_engine import run_black, run_flake8
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SECTION = "multi-agent-reviewer"
+
+
+@dataclass(frozen=True)
+class Analyzer:
+    name: str
+    parse: Callable[[str], List[Dict]]
+    # Exactly one of these is set: a function run in the warm analyzer pool, or
+    # a command line the changed files are appended to.
+    in_process: Callable[[str, List[str]], dict] | None = None
+    command: List[str] | None = None
+    # Whether findings for a file depend only on that file's content.
+    cacheable: bool = True
+
+
+REGISTRY: Dict[str, Analyzer] = {
+    analyzer.name: analyzer
+    for analyzer in (
+        Analyzer("black", parse=parse_black_diff, in_process=run_black),
+        Analyzer("flake8", parse=parse_flake8_output, in_process=run_flake8),
+        Analyzer(
+            "ruff",
+            parse=lambda out: parse_flake8_output(out, tool="ruff"),
+            command=["ruff", "check", "--no-cache", "--output-format=concise"],
+        ),
+        Analyzer(
+            "bandit",
+            parse=lambda out: parse_flake8_output(out, tool="bandit"),
+            command=[
+                "bandit",
+                "--quiet",
+                "--format=custom",
+                "--msg-template={relpath}:{line}:{col}: {test_id} {msg}",
+            ],
+        ),
+        Analyzer(
+            "mypy",
+            parse=parse_mypy_output,
+            command=[
+                "mypy",
+                "--show-column-numbers",
+                "--show-error-codes",
+                "--no-error-summary",
+                "--no-color-output",
+                "--ignore-missing-imports",
+                "--follow-imports=silent",
+            ],
+            # Types flow across modules, so a file's result isn't a function of
+            # its own blob.
+            cacheable=False,
+        ),
+    )
+}
+
+
+def select_analyzers(root: str) -> List[Analyzer]:
+    # Repos opt into analyzers with
+    #   [tool.multi-agent-reviewer]
+    #   analyzers = ["black", "flake8", "ruff"]
+    # in their pyproject.toml; everyone else gets the default set.
+    names = settings.default_analyzers
+    pyproject = os.path.join(root, "pyproject.toml")
+
+    if os.path.isfile(pyproject):
+        try:
+            with open(pyproject, "rb") as f:
+                config = tomllib.load(f).get("tool", {}).get(CONFIG_SECTION, {})
+            names = config.get("analyzers", names)
+        except tomllib.TOMLDecodeError as e:
+            logger.warning(f"Ignoring unparsable pyproject.toml: {e}")
+
+    selected = []
+    for name in names:
+        if name in REGISTRY:
+            selected.append(REGISTRY[name])
+        else:
+            logger.warning(f"Unknown analyzer {name!r} in repo config, skipping")
+
+    return selected
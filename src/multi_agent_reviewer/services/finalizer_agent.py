@@ -3,7 +3,12 @@ from rq import get_current_job
 from ..db import session
 from ..models.Task import Task, TaskStatus
 from ..config import settings
+from ..utils.incremental import carry_forward
+from ..utils.metrics import STAGE_SECONDS
+from ..utils.review_state import clear_pipeline, is_superseded
+from ..utils.task_events import set_status
 from redis import Redis
+from datetime import datetime
 from typing import cast
 import logging
 
@@ -11,15 +16,18 @@ logger = logging.getLogger(__name__)
 redis = Redis.from_url(settings.redis_url, decode_responses=True)
 
 
-def _unlock_pr(owner: str, repo: str, pr_number: int):
-    lock_key = f"lock:pr:{owner}:{repo}:{pr_number}"
-    redis.delete(lock_key)
+def _unlock_pr(task: Task):
+    clear_pipeline(task.owner, task.repo, task.pr_number, task.payload["head_sha"])
 
 
 def on_failure(job, conneciton, type, value, traceback):
     logger.error(f"Job {job.id} failed with error: {value}")
     task_id = job.meta.get("task_id")
 
+    if job.retries_left:
+        # RQ calls this on every failed attempt; only the last one is final.
+        return
+
     if not task_id:
         return
 
@@ -29,12 +37,18 @@ def on_failure(job, conneciton, type, value, traceback):
         task.status = TaskStatus.FAILED
         task.result = {"error": f"Job {job.id} failed: {value}"}
         session.commit()
-        _unlock_pr(task.owner, task.repo, task.pr_number)
+        set_status(task_id, TaskStatus.FAILED.value, error=task.result["error"])
+        _unlock_pr(task)
 
     session.close()
 
 
 def finalize_review(task_id: int, llm_job_id: str, static_job_id: str):
+    with STAGE_SECONDS.time(stage="finalize"):
+        _finalize_review(task_id, llm_job_id, static_job_id)
+
+
+def _finalize_review(task_id: int, llm_job_id: str, static_job_id: str):
     global task
     try:
         task = cast(Task, session.get(Task, task_id))
@@ -44,25 +58,68 @@ def finalize_review(task_id: int, llm_job_id: str, static_job_id: str):
             logger.error(f"Task {task_id} not found.")
             return
 
-        static_job = Job.fetch(static_job_id, connection=redis)
-        llm_job = Job.fetch(llm_job_id, connection=redis)
+        if is_superseded(task.payload):
+            logger.info(f"Task {task_id} was superseded by a newer push")
+            task.status = TaskStatus.SUPERSEDED
+            session.commit()
+            set_status(task_id, TaskStatus.SUPERSEDED.value)
+            return
+
+        static_job = Job.fetch(static_job_id, connection=current_job.connection)
+        llm_job = Job.fetch(llm_job_id, connection=current_job.connection)
+
+        static_checks = static_job.result
+        llm_suggestions = llm_job.result or []
+        incremental = task.payload.get("incremental")
+        result = {}
+
+        if incremental:
+            # Only the hunks this push touched were reviewed; bring the rest of
+            # the last review's results over to the new head.
+            previous = session.get(Task, incremental["previous_task_id"])
+            carried = carry_forward(previous.result if previous else None, incremental)
+
+            if isinstance(static_checks, dict):
+                static_checks = {
+                    **static_checks,
+                    "findings": static_checks.get("findings", []) + carried["findings"],
+                }
+            llm_suggestions = llm_suggestions + carried["llm_suggestions"]
+            result["incremental"] = {
+                "base_sha": incremental["base_sha"],
+                "carried_findings": len(carried["findings"]),
+                "carried_suggestions": len(carried["llm_suggestions"]),
+            }
 
         task.status = TaskStatus.COMPLETED
+        task.completed_at = datetime.now()
         task.result = {
-            "static_checks": static_job.result,
-            "llm_suggestions": llm_job.result,
+            "static_checks": static_checks,
+            "llm_suggestions": llm_suggestions,
+            **result,
         }
 
         session.commit()
+        set_status(
+            task_id,
+            TaskStatus.COMPLETED.value,
+            findings=(
+                len(static_checks.get("findings", []))
+                if isinstance(static_checks, dict)
+                else 0
+            ),
+            suggestions=len(llm_suggestions),
+        )
         logger.info(f"Job {current_job.id} has completed sucessfully")
     except Exception as e:
         logger.error(f"Error in finalize_review for task {task_id}: {e}")
         task.status = TaskStatus.FAILED
         task.result = {"error": str(e)}
         session.commit()
+        set_status(task_id, TaskStatus.FAILED.value, error=str(e))
         raise
 
     finally:
         session.close()
         if "task" in locals() and task:
-            _unlock_pr(task.owner, task.repo, task.pr_number)
+            _unlock_pr(task)
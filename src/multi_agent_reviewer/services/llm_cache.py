@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import orjson
+from redis import Redis
+from typing import Dict, List, Tuple
+from ..config import settings
+from ..utils.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+redis = Redis.from_url(settings.redis_url, decode_responses=True)
+
+# Suggestions per hunk, with line numbers stored relative to the hunk's start
+# so a hunk that only moved on a later push can reuse them.
+cache = RedisCache(
+    redis,
+    "llm:cache",
+    ttl=settings.llm_cache_ttl,
+    max_entries=settings.llm_cache_max_entries,
+)
+
+HunkId = Tuple[str, int]
+
+
+def _hunk_range(hunk: Dict) -> Tuple[int, int]:
+    return hunk["start"], hunk["start"] + max(hunk["len"], 1) - 1
+
+
+def _hunk_for(hunks: List[Dict], line: int) -> Dict | None:
+    for hunk in hunks:
+        start, end = _hunk_range(hunk)
+        if start <= line <= end:
+            return hunk
+    return None
+
+
+def hunk_key(path: str, hunk: Dict, findings: List[Dict], version: str) -> str:
+    # Only content goes into the key, not position: a hunk that shifted because
+    # of edits elsewhere in the file still hits.
+    start, end = _hunk_range(hunk)
+    relevant = sorted(
+        (f["tool"], f["code"], f["line"] - start, f["message"])
+        for f in findings
+        if f["file"] == path and start <= f["line"] <= end
+    )
+    digest = hashlib.sha256(
+        orjson.dumps(
+            {
+                "path": path,
+                "lines": [line.rstrip() for line in hunk["lines"]],
+                "findings": relevant,
+            }
+        )
+    )
+    return f"{version}:{digest.hexdigest()}"
+
+
+def split_cached(
+    changed_hunks: Dict[str, List[Dict]], findings: List[Dict], version: str
+) -> Tuple[List[Dict], Dict[str, List[Dict]], Dict[HunkId, str]]:
+    # Returns the cached suggestions re-anchored to the hunks' current lines,
+    # the hunks that still need a review, and the cache key of each of those.
+    keys = {
+        (path, hunk["start"]): hunk_key(path, hunk, findings, version)
+        for path, hunks in changed_hunks.items()
+        for hunk in hunks
+    }
+    cached = dict(zip(keys, cache.get_many(list(keys.values()))))
+    suggestions: List[Dict] = []
+    misses: Dict[str, List[Dict]] = {}
+
+    for path, hunks in changed_hunks.items():
+        for hunk in hunks:
+            hit = cached[(path, hunk["start"])]
+
+            if hit is None:
+                misses.setdefault(path, []).append(hunk)
+                continue
+
+            for s in hit:
+                start_offset = s.pop("start_offset")
+                end_offset = s.pop("end_offset")
+                suggestions.append(
+                    {
+                        **s,
+                        "file": path,
+                        "start_line": hunk["start"] + start_offset,
+                        "end_line": hunk["start"] + end_offset,
+                    }
+                )
+
+    miss_keys = {
+        (path, hunk["start"]): keys[(path, hunk["start"])]
+        for path, hunks in misses.items()
+        for hunk in hunks
+    }
+    return suggestions, misses, miss_keys
+
+
+def store(
+    reviewed: Dict[str, List[Dict]], suggestions: List[Dict], keys: Dict[HunkId, str]
+):
+    # Caches what one batch said about each of its hunks, including hunks it
+    # had nothing to say about. Suggestions outside every hunk aren't cached.
+    by_hunk: Dict[HunkId, List[Dict]] = {
+        (path, hunk["start"]): [] for path, hunks in reviewed.items() for hunk in hunks
+    }
+
+    for s in suggestions:
+        hunk = _hunk_for(reviewed.get(s["file"], []), s["start_line"])
+        if hunk is None:
+            continue
+
+        entry = {k: v for k, v in s.items() if k not in ("start_line", "end_line")}
+        entry["start_offset"] = s["start_line"] - hunk["start"]
+        entry["end_offset"] = s["end_line"] - hunk["start"]
+        by_hunk[(s["file"], hunk["start"])].append(entry)
+
+    cache.set_many({keys[hunk_id]: entries for hunk_id, entries in by_hunk.items()})
+
+
+def stats() -> Dict[str, float]:
+    counts = cache.stats()
+    lookups = counts["hits"] + counts["misses"]
+    return {**counts, "hit_rate": counts["hits"] / lookups if lookups else 0.0}
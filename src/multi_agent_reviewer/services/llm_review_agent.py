@@ -1,16 +1,33 @@
 from rq.job import Job
 from rq import get_current_job
 from ..config import settings
-from redis import Redis
+from . import llm_cache
+from ..utils import llm_rate_limiter
+from ..utils.artifact_store import resolve
+from ..utils.metrics import LLM_TOKENS, STAGE_SECONDS
+from ..utils.prompt_planner import estimate_tokens, plan_batches, render_hunks
+from ..utils.review_state import Superseded, is_superseded
+from ..utils.task_events import publish, set_stage
 from pydantic import BaseModel, Field, SecretStr
 from langchain_core.messages import AIMessage
 from langchain_core.prompts import PromptTemplate
 from langchain_groq import ChatGroq
-from typing import Any, Dict, List, Any
+from typing import Any, Callable, Dict, List, Any
 from typing import cast
+import asyncio
+import concurrent.futures
+import importlib
 import logging
+import os
+import threading
+import time
 
-redis = Redis.from_url(settings.redis_url, decode_responses=True)
+# One event loop and one LLM client per process, shared by every review it
+# runs. The client's async connections belong to the loop they were opened
+# on, so both are replaced together in a forked child.
+_loop: asyncio.AbstractEventLoop | None = None
+_llm: Any = None
+_pid: int | None = None
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +48,10 @@ class LLMResponse(BaseModel):
     suggestions: List[Suggestion] = []
 
 
+# Bump whenever PROMPT or the response models change, so cached reviews made
+# with the old prompt are not reused.
+PROMPT_VERSION = "2"
+
 PROMPT = """You are a concise code reviewer. Return only JSON that matches the format instructions.
 
         PR_TITLE:
@@ -55,22 +76,172 @@ prompt_template = PromptTemplate(
 
 def _make_llm():
     # Create and return the LLM instance. Allows for diversity and easier testing
+    if settings.llm_factory:
+        module, _, name = settings.llm_factory.partition(":")
+        return getattr(importlib.import_module(module), name)()
+
     llm = ChatGroq(
-        model="gpt-4o-mini",
+        model=settings.llm_model,
         api_key=SecretStr(settings.groq_api_key),
         temperature=0.2,
-        max_tokens=4000,
+        max_tokens=settings.llm_max_output_tokens,
     )
     return llm
 
 
+def _static_summary_for(static_result: Any, files: List[str]) -> str:
+    # Each batch only sees the static findings for its own files.
+    if not isinstance(static_result, dict):
+        return str(static_result)
+
+    findings = [f for f in static_result.get("findings", []) if f["file"] in files]
+    lines = [
+        f"{f['file']}:{f['line']}: [{f['tool']}] {f['code']} {f['message']}"
+        for f in findings
+    ]
+    return "\n".join(lines) or "No static analysis findings for these files."
+
+
+def _merge_suggestions(batches: List[List[Suggestion]]) -> List[Suggestion]:
+    # Batches can overlap in what they flag; keep the most confident copy of
+    # each suggestion and make ids unique across batches.
+    merged: Dict[tuple, Suggestion] = {}
+
+    for batch in batches:
+        for suggestion in batch:
+            key = (
+                suggestion.file,
+                suggestion.start_line,
+                suggestion.end_line,
+                suggestion.patch.strip(),
+            )
+            if key not in merged or suggestion.confidence > merged[key].confidence:
+                merged[key] = suggestion
+
+    suggestions = sorted(merged.values(), key=lambda s: (s.file, s.start_line))
+    seen_ids = set()
+
+    for i, suggestion in enumerate(suggestions):
+        if suggestion.id in seen_ids:
+            suggestions[i] = suggestion = suggestion.model_copy(
+                update={"id": f"{suggestion.id}-{i}"}
+            )
+        seen_ids.add(suggestion.id)
+
+    return suggestions
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _llm, _pid
+
+    if _loop is None or _pid != os.getpid():
+        _loop = asyncio.new_event_loop()
+        threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        _llm = None
+        _pid = os.getpid()
+
+    return _loop
+
+
+def get_llm():
+    global _llm
+
+    get_loop()
+    if _llm is None:
+        _llm = _make_llm()
+
+    return _llm
+
+
+def _run(coro):
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        # Waits in short slices so the job timeout, raised asynchronously in
+        # this thread, can interrupt it.
+        while not future.done():
+            concurrent.futures.wait([future], timeout=1)
+        return future.result()
+    finally:
+        future.cancel()
+
+
+def _record_call(waited: float, elapsed: float, usage: dict | None):
+    # "llm_wait" is the time spent on this process's semaphore and the shared
+    # rate limiter before the call went out.
+    STAGE_SECONDS.observe(waited, stage="llm_wait")
+    STAGE_SECONDS.observe(elapsed, stage="llm")
+
+    if usage:
+        LLM_TOKENS.observe(usage["input_tokens"], kind="input")
+        LLM_TOKENS.observe(usage["output_tokens"], kind="output")
+
+
+async def _review_batch(
+    chain,
+    prompt_input: dict,
+    semaphore: asyncio.Semaphore,
+    task_id: int | None,
+    stop: Callable[[], bool] | None = None,
+) -> LLMResponse:
+    estimated = (
+        estimate_tokens(prompt_template.format(**prompt_input))
+        + settings.llm_output_token_estimate
+    )
+
+    queued = time.perf_counter()
+
+    async with semaphore:
+        # Batches beyond the first few wait here; a newer push since then
+        # means this one's call would be wasted.
+        if stop is not None and await asyncio.to_thread(stop):
+            raise Superseded()
+
+        await llm_rate_limiter.acquire(estimated)
+        started = time.perf_counter()
+        result = await chain.ainvoke(prompt_input)
+        elapsed = time.perf_counter() - started
+
+    usage = getattr(result["raw"], "usage_metadata", None)
+    if usage:
+        await llm_rate_limiter.settle(estimated, usage["total_tokens"])
+
+    await asyncio.to_thread(_record_call, started - queued, elapsed, usage)
+
+    if result["parsed"] is None:
+        raise result["parsing_error"] or ValueError("LLM returned no structured output")
+
+    response = cast(LLMResponse, result["parsed"])
+    # Watchers see each batch as it lands; the merged, deduplicated list is
+    # what the finalizer stores.
+    await asyncio.to_thread(
+        publish,
+        task_id,
+        "suggestions",
+        suggestions=[s.model_dump() for s in response.suggestions],
+    )
+    return response
+
+
+async def _review_batches(
+    chain,
+    prompt_inputs: List[dict],
+    task_id: int | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> List[Any]:
+    # Batches run concurrently, so a big PR takes about as long as its slowest
+    # batch rather than the sum of them.
+    semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+    return await asyncio.gather(
+        *(_review_batch(chain, p, semaphore, task_id, stop) for p in prompt_inputs),
+        return_exceptions=True,
+    )
+
+
 def run_llm_review(payload: dict, static_job_id: str):
     owner = payload["owner"]
     repo = payload["repo"]
     pr = payload["pr"]
-
-    static_job = Job.fetch(static_job_id, connection=redis)
-    static_summary = static_job.result
+    task_id = payload.get("task_id")
 
     job = get_current_job()
 
@@ -78,35 +249,110 @@ def run_llm_review(payload: dict, static_job_id: str):
         logger.error("No current job found for LLM review.")
         raise Exception("No current job found.")
 
-    job.meta["stage"] = "llm:started"
-    job.save_meta()
+    if is_superseded(payload):
+        logger.info(f"Skipping LLM review for {owner}/{repo} PR #{pr}, newer push")
+        set_stage(job, task_id, "llm:superseded")
+        return []
+
+    # Job hashes hold compressed pickles, which a decode_responses client
+    # can't read; the worker's own connection can.
+    static_job = Job.fetch(static_job_id, connection=job.connection)
+    static_summary = static_job.result
+
+    set_stage(job, task_id, "llm:started")
 
     logger.info(f"Running LLM review for {owner}/{repo} PR #{pr} with static summary.")
 
-    prompt_input = {
-        "pr_title": payload.get("pr_title", ""),
-        "changed_hunks": payload.get("changed_hunks", ""),
-        "static_summary": str(static_summary),
-    }
-    llm = _make_llm()
-    structured_llm = llm.with_structured_output(LLMResponse)
+    findings = (
+        static_summary.get("findings", []) if isinstance(static_summary, dict) else []
+    )
+    cache_version = f"{settings.llm_model}:{PROMPT_VERSION}"
+    changed_hunks = resolve(payload.get("changed_hunks")) or {}
+    cached, misses, keys = llm_cache.split_cached(
+        changed_hunks, findings, cache_version
+    )
+
+    if cached:
+        publish(task_id, "suggestions", suggestions=cached, cached=True)
+
+    batches = plan_batches(misses, settings.llm_batch_token_budget)
+    prompt_inputs = [
+        {
+            "pr_title": payload.get("pr_title", ""),
+            "changed_hunks": render_hunks(batch.hunks),
+            "static_summary": _static_summary_for(static_summary, list(batch.hunks)),
+        }
+        for batch in batches
+    ]
+    logger.info(
+        f"Reviewing {owner}/{repo} PR #{pr}: {len(keys)} uncached hunks in "
+        f"{len(batches)} batches, {len(cached)} cached suggestions"
+    )
+
+    llm = get_llm()
+    # The raw message carries the token usage the rate limiter settles with.
+    structured_llm = llm.with_structured_output(LLMResponse, include_raw=True)
 
     try:
         chain = prompt_template | structured_llm
-        parsed_output: LLMResponse = cast(LLMResponse, chain.invoke(prompt_input))
+        results = _run(
+            _review_batches(
+                chain, prompt_inputs, task_id, stop=lambda: is_superseded(payload)
+            )
+        )
+        superseded = any(isinstance(r, Superseded) for r in results)
+        failed = [
+            r
+            for r in results
+            if isinstance(r, Exception) and not isinstance(r, Superseded)
+        ]
+
+        for e in failed:
+            logger.error(f"LLM batch failed for {owner}/{repo} PR #{pr}: {e}")
+
+        fresh = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                continue
+            response = cast(LLMResponse, result)
+            llm_cache.store(
+                batch.hunks, [s.model_dump() for s in response.suggestions], keys
+            )
+            fresh.append(response.suggestions)
+
+        if superseded:
+            # Batches that finished are cached above; the rest never ran.
+            logger.info(f"Stopping LLM review for {owner}/{repo} PR #{pr}, newer push")
+            set_stage(job, task_id, "llm:superseded")
+            return []
+
+        if failed:
+            # A review missing some hunks must not pass as complete. The
+            # batches that succeeded are cached above, so RQ's retry only
+            # sends the failed ones again.
+            raise RuntimeError(
+                f"{len(failed)} of {len(results)} LLM batches failed: {failed[0]}"
+            ) from failed[0]
+
+        suggestions = _merge_suggestions([[Suggestion(**s) for s in cached], *fresh])
 
     except Exception as e:
         logger.error(
             f"Error during LLM invocation or parsing for {owner}/{repo} PR #{pr}: {e}"
         )
-        job.meta["stage"] = "llm:failed"
-        job.save_meta()
+        set_stage(job, task_id, "llm:failed", error=str(e))
         raise
 
-    job.meta["stage"] = "llm:completed"
-    job.save_meta()
+    counts = {
+        "batches": len(batches),
+        "cached_hunks": sum(map(len, changed_hunks.values())) - len(keys),
+        "reviewed_hunks": len(keys),
+    }
+    job.meta.update(counts)
+    set_stage(job, task_id, "llm:completed", suggestions=len(suggestions), **counts)
 
     logger.info(
-        f"LLM review completed for {owner}/{repo} PR #{pr} with {len(parsed_output.suggestions)} suggestions."
+        f"LLM review completed for {owner}/{repo} PR #{pr} with {len(suggestions)} suggestions."
     )
-    return [s.model_dump() for s in parsed_output.suggestions]
+    logger.info(f"LLM cache: {llm_cache.stats()}")
+    return [s.model_dump() for s in suggestions]
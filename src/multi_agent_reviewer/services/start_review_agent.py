@@ -1,65 +1,202 @@
 from rq import get_current_job, Queue, Retry
-from rq.job import Job
 from redis import Redis
+from sqlalchemy import select
+import httpx
 from ..config import settings
-from typing import cast
 from ..db import session
 from ..models.Task import Task, TaskStatus
 import logging
-import time
-from ..utils.github_utils import get_changed_hunks
-
-LOCK_PREFIX = "lock:pr"
+from ..utils.github_client import RateLimitExceeded
+from ..utils.github_utils import get_changed_hunks, get_compare_ranges
+from ..utils.artifact_store import offload
+from ..utils.incremental import header_only, restrict_to_delta
+from ..utils.task_events import publish, set_status
+from ..utils.review_state import (
+    cancel_pipeline,
+    clear_pipeline,
+    get_pipeline,
+    is_superseded,
+    swap_pipeline,
+)
 
 redis = Redis.from_url(settings.redis_url, decode_responses=True)
 queue = Queue("default", connection=redis)
+# Served by workers/llm_worker.py, which runs many reviews per process, or
+# by the regular workers unless LLM_DEDICATED_WORKER is set.
+llm_queue = Queue("llm", connection=redis)
 logger = logging.getLogger(__name__)
 
 
-def _lock_key(owner: str, repo: str, pr_number: int) -> str:
-    return f"{LOCK_PREFIX}:{owner}:{repo}:{pr_number}"
+def _mark_superseded(task_id: int, head_sha: str):
+    task = session.get(Task, task_id)
+
+    if task and task.status in (TaskStatus.PENDING, TaskStatus.IN_PROGRESS):
+        task.status = TaskStatus.SUPERSEDED
+        task.result = {"superseded_by": head_sha}
+        session.commit()
+        set_status(task_id, TaskStatus.SUPERSEDED.value, superseded_by=head_sha)
+
+
+def _last_reviewed(owner: str, repo: str, pr: int) -> Task | None:
+    return session.scalars(
+        select(Task)
+        .where(
+            Task.owner == owner,
+            Task.repo == repo,
+            Task.pr_number == pr,
+            Task.status == TaskStatus.COMPLETED,
+            Task.head_sha.isnot(None),
+        )
+        .order_by(Task.id.desc())
+        .limit(1)
+    ).first()
+
+
+def _incremental_hunks(
+    payload: dict, changed_hunks: dict, previous: Task
+) -> dict | None:
+    # Narrows the review to the PR hunks this push touched since `previous`.
+    # Returns None (review everything) if GitHub can't compare the two heads,
+    # or if a force-push or rebase means the new head doesn't build on the old.
+    owner, repo, head_sha = payload["owner"], payload["repo"], payload["head_sha"]
+
+    try:
+        delta = get_compare_ranges(
+            owner, repo, previous.head_sha, head_sha, payload["installation_id"]
+        )
+    except httpx.HTTPStatusError as e:
+        logger.info(f"Can't compare {previous.head_sha}...{head_sha}, full review: {e}")
+        return None
+
+    if delta is None:
+        logger.info(f"{head_sha} doesn't descend from {previous.head_sha}, full review")
+        return None
+
+    reviewed = restrict_to_delta(changed_hunks, delta)
+    payload["incremental"] = {
+        "base_sha": previous.head_sha,
+        "previous_task_id": previous.id,
+        "pr_files": list(changed_hunks),
+        "delta": delta,
+        "reviewed": header_only(reviewed),
+    }
+    logger.info(
+        f"Incremental review of {owner}/{repo} PR #{payload['pr']} since "
+        f"{previous.head_sha}: {sum(map(len, reviewed.values()))} of "
+        f"{sum(map(len, changed_hunks.values()))} hunks"
+    )
+    return reviewed
 
 
 def start_revew_agent(payload: dict):
-    job = cast(Job, get_current_job())
     owner = payload["owner"]
     repo = payload["repo"]
     pr = payload["pr"]
+    head_sha = payload["head_sha"]
 
-    lock_key = _lock_key(owner, repo, pr)
-    got = redis.set(lock_key, job.get_id(), nx=True, ex=60 * 10)
+    if is_superseded(payload):
+        logger.info(f"Skipping {owner}/{repo} PR #{pr} at {head_sha}, newer push")
+        return {"status": "skipped", "reason": "superseded"}
 
-    if not got:
+    running = get_pipeline(owner, repo, pr)
+
+    if running and running["head_sha"] == head_sha:
         logger.info(f"Review job already in progress for {owner}/{repo} PR #{pr}")
         return {"status": "skipped", "reason": "already_running"}
 
-    new_task = Task(
-        owner=owner,
-        repo=repo,
-        pr_number=pr,
-        status=TaskStatus.IN_PROGRESS,
-        payload=payload,
+    job = get_current_job()
+    # A retry of this job, e.g. after a rate limit, carries on with the task
+    # its first attempt made rather than adding another.
+    new_task = (
+        session.get(Task, job.meta["task_id"])
+        if job and "task_id" in job.meta
+        else None
     )
 
-    session.add(new_task)
+    if new_task is None:
+        new_task = Task(
+            owner=owner,
+            repo=repo,
+            pr_number=pr,
+            head_sha=head_sha,
+            status=TaskStatus.IN_PROGRESS,
+            payload=payload,
+        )
+        session.add(new_task)
+    else:
+        new_task.status = TaskStatus.IN_PROGRESS
+        new_task.result = None
+
     session.commit()
     session.refresh(new_task)
 
+    if job:
+        job.meta["task_id"] = new_task.id
+        job.save_meta()
+
+    # Jobs use it to publish their progress to the task's watchers.
+    payload["task_id"] = new_task.id
+    publish(
+        new_task.id,
+        "status",
+        {
+            "status": TaskStatus.IN_PROGRESS.value,
+            "owner": owner,
+            "repo": repo,
+            "pr": pr,
+            "head_sha": head_sha,
+        },
+        status=TaskStatus.IN_PROGRESS.value,
+    )
+
     try:
         changed_hunks = get_changed_hunks(owner, repo, pr, payload["installation_id"])
+        previous = (
+            _last_reviewed(owner, repo, pr) if settings.incremental_review else None
+        )
 
-        payload["changed_hunks"] = changed_hunks
+        if previous and previous.head_sha != head_sha:
+            reviewed = _incremental_hunks(payload, changed_hunks, previous)
+            if reviewed is not None:
+                changed_hunks = reviewed
+
+        if "incremental" in payload:
+            # The finalizer needs this to carry the earlier results forward.
+            new_task.payload = {
+                **new_task.payload,
+                "incremental": payload["incremental"],
+            }
+            session.commit()
+
+        # Both review jobs get the hunks; as a reference they aren't copied
+        # into each job's arguments in Redis.
+        payload["changed_hunks"] = offload(changed_hunks)
+        publish(
+            new_task.id,
+            "stage",
+            {"stage": "start:queued"},
+            stage="start:queued",
+            files=len(changed_hunks),
+            hunks=sum(map(len, changed_hunks.values())),
+            incremental="incremental" in payload,
+        )
 
         static_agent = queue.enqueue(
             "multi_agent_reviewer.services.static_check_agent.run_static_checks",
             args=(payload,),
+            on_failure="multi_agent_reviewer.services.finalizer_agent.on_failure",
+            meta={"task_id": new_task.id},
             timeout=10 * 60,
             retry=Retry(max=2),
         )
 
-        llm_agent = queue.enqueue(
+        llm_agent = llm_queue.enqueue(
             "multi_agent_reviewer.services.llm_review_agent.run_llm_review",
             args=(payload, static_agent.get_id()),
+            # A stage that runs out of retries leaves the finalizer deferred
+            # forever, so the task is failed from here instead.
+            on_failure="multi_agent_reviewer.services.finalizer_agent.on_failure",
+            meta={"task_id": new_task.id},
             timeout=10 * 60,
             retry=Retry(max=2),
             depends_on=static_agent,
@@ -69,19 +206,45 @@ def start_revew_agent(payload: dict):
             "multi_agent_reviewer.services.finalizer_agent.finalize_review",
             args=(new_task.id, llm_agent.get_id(), static_agent.get_id()),
             on_failure="multi_agent_reviewer.services.finalizer_agent.on_failure",
+            meta={"task_id": new_task.id},
             timeout=10 * 60,
             retry=Retry(max=2),
             depends_on=llm_agent,
         )
 
+        previous = swap_pipeline(
+            owner,
+            repo,
+            pr,
+            head_sha,
+            new_task.id,
+            [static_agent.get_id(), llm_agent.get_id(), finalizer_agent.get_id()],
+        )
+
+        if previous and previous["head_sha"] != head_sha:
+            logger.info(
+                f"Superseding review of {previous['head_sha']} for {owner}/{repo} PR #{pr}"
+            )
+            cancel_pipeline(previous)
+            _mark_superseded(previous["task_id"], head_sha)
+
         logger.info(f"Enqueued review agents for {owner}/{repo} PR #{pr}")
         return {"status": "started", "task_id": new_task.id}
+    except RateLimitExceeded as e:
+        # Not a failure: the job is rescheduled for when the budget is back.
+        logger.warning(f"Review of {owner}/{repo} PR #{pr} waits for GitHub: {e}")
+        new_task.status = TaskStatus.PENDING
+        new_task.result = {"error": str(e)}
+        session.commit()
+        set_status(new_task.id, TaskStatus.PENDING.value, error=str(e))
+        raise
     except Exception as e:
         logger.error(f"Error processing review for {owner}/{repo} PR #{pr}: {e}")
         new_task.status = TaskStatus.FAILED
         new_task.result = {"error": str(e)}
         session.commit()
-        redis.delete(lock_key)
+        set_status(new_task.id, TaskStatus.FAILED.value, error=str(e))
+        clear_pipeline(owner, repo, pr, head_sha)
         raise
     finally:
         session.close()
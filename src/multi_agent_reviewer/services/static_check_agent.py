@@ -1,18 +1,49 @@
-import os, shutil, logging
+import os, logging
 from rq.job import Job
 from rq import get_current_job
-from ..utils.utils import run_command
+from ..utils.artifact_store import offload, resolve
+from ..utils.diff_utils import changed_line_ranges
+from ..utils.lint_utils import LINTER_CONFIG_FILES, filter_to_changed_lines
 from ..utils.github_utils import clone_github_repo
+from ..utils.mirror_cache import remove_worktree
+from ..utils.review_state import is_superseded
+from ..utils.task_events import publish, set_stage
+from .analyzer_cache import analyze_files
+from .analyzer_engine import Stopped
+from .analyzers import select_analyzers
 
 logger = logging.getLogger(__name__)
 
 
+def _offload_output(artifacts: dict) -> dict:
+    # Raw tool output can run to megabytes. The result is kept by RQ and then
+    # copied into the task, so large output is stored once and referenced.
+    return {
+        name: {
+            **artifact,
+            "stdout": offload(artifact["stdout"]),
+            "stderr": offload(artifact["stderr"]),
+        }
+        for name, artifact in artifacts.items()
+    }
+
+
+def _superseded(job, payload: dict) -> dict:
+    logger.info(
+        f"Stopping static checks for {payload['owner']}/{payload['repo']}"
+        f"@{payload['head_sha']}, newer push"
+    )
+    set_stage(job, payload.get("task_id"), "static:superseded")
+    return {"status": "superseded"}
+
+
 def run_static_checks(payload: dict):
     owner = payload["owner"]
     repo = payload["repo"]
     pr_number = payload["pr"]
     installation_id = payload["installation_id"]
     head_sha = payload["head_sha"]
+    task_id = payload.get("task_id")
 
     job = get_current_job()
 
@@ -20,29 +51,69 @@ def run_static_checks(payload: dict):
         logger.error("No current job found for static checks.")
         raise Exception("No current job found.")
 
-    job.meta["stage"] = "static:started"
-    job.save_meta()
+    if is_superseded(payload):
+        return _superseded(job, payload)
+
+    set_stage(job, task_id, "static:started")
 
-    tmpdir = clone_github_repo(owner, repo, head_sha, installation_id)
+    changed_hunks = resolve(payload.get("changed_hunks")) or {}
+    changed_files = list(changed_hunks)
+    tmpdir = clone_github_repo(
+        owner,
+        repo,
+        head_sha,
+        installation_id,
+        paths=changed_files + LINTER_CONFIG_FILES,
+    )
 
     try:
+        # Cloning can take a while; a newer push may have landed meanwhile.
+        if is_superseded(payload):
+            return _superseded(job, payload)
+
         logger.info(
             f"Running static checks for {owner}/{repo} PR #{pr_number} at commit {head_sha}"
         )
-        ## For now running the linter and formatting checks in the venv of the worker.
+        ## For now running the linter and formatting checks in the worker's analyzer pool.
         ## TODO: Move this to a containerized environment for better isolation.
-        black = run_command(["black", "--check", "."], cwd=tmpdir)
-        flake = run_command(["flake8", "."], cwd=tmpdir)
+        # Only lint Python files the PR touched that still exist at head.
+        py_files = [
+            f
+            for f in changed_files
+            if f.endswith(".py") and os.path.isfile(os.path.join(tmpdir, f))
+        ]
+
+        analyzers = select_analyzers(tmpdir)
+        try:
+            artifacts, file_findings = analyze_files(
+                tmpdir, py_files, analyzers, stop=lambda: is_superseded(payload)
+            )
+        except Stopped:
+            return _superseded(job, payload)
+
+        timed_out = [name for name, a in artifacts.items() if a.get("timed_out")]
+
+        ranges_by_file = {
+            filename: changed_line_ranges(hunks)
+            for filename, hunks in changed_hunks.items()
+        }
+        findings = filter_to_changed_lines(file_findings, ranges_by_file)
 
         aggregated = {
-            "status": "ok" if black["returncode"] == 0 else "failed",
-            "artifacts": {"black": black, "flake8": flake},
-            "summary": {"errors": len(flake.get("stdout", ""))},
+            "status": "ok" if not findings else "failed",
+            "artifacts": _offload_output(artifacts),
+            "findings": findings,
+            "summary": {
+                "errors": len(findings),
+                "files_checked": len(py_files),
+                "analyzers": [a.name for a in analyzers],
+                "timed_out": timed_out,
+            },
             "workspace": tmpdir,
         }
 
-        job.meta["stage"] = "static:completed"
-        job.save_meta()
+        set_stage(job, task_id, "static:completed", **aggregated["summary"])
+        publish(task_id, "findings", findings=findings)
 
         logger.info(
             f"Static checks completed for {owner}/{repo} PR #{pr_number} with status {aggregated['status']}"
@@ -53,8 +124,7 @@ def run_static_checks(payload: dict):
         logger.error(
             f"Error during static checks for {owner}/{repo} PR #{pr_number}: {e}"
         )
-        job.meta["stage"] = "static:failed"
-        job.save_meta()
+        set_stage(job, task_id, "static:failed", error=str(e))
         raise
     finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        remove_worktree(tmpdir)
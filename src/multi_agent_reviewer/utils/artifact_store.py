@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+import orjson
+import zstandard
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Marks a value that was moved to the store. Refs are plain dicts so they
+# survive RQ's pickling and Postgres' JSON columns unchanged.
+REF_KEY = "$artifact"
+
+# How often a worker process looks for expired local blobs.
+SWEEP_INTERVAL = 60 * 60
+
+
+class LocalArtifactStore:
+    # Also the stand-in for S3 in development. Blobs are written to a temp
+    # file and renamed into place, so readers never see a partial one.
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.zst")
+
+    def refresh(self, digest: str) -> bool:
+        # A blob referenced again gets a new mtime, so sweep() keeps it for
+        # another TTL.
+        try:
+            os.utime(self._path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def write(self, digest: str, blob: bytes):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def read(self, digest: str) -> bytes:
+        with open(self._path(digest), "rb") as f:
+            return f.read()
+
+    def sweep(self, ttl: int, interval: int):
+        # Deletes blobs, and temp files left by crashed writers, untouched for
+        # `ttl`. The marker's mtime is when any process last swept, so a
+        # shared directory is walked once per `interval`, not once per worker.
+        marker = os.path.join(self.root, ".swept")
+        now = time.time()
+
+        try:
+            if now - os.stat(marker).st_mtime < interval:
+                return
+        except FileNotFoundError:
+            os.makedirs(self.root, exist_ok=True)
+
+        with open(marker, "a"):
+            os.utime(marker)
+
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if path != marker and os.stat(path).st_mtime < now - ttl:
+                        os.unlink(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        logger.info(f"Removed {removed} expired artifacts from {self.root}")
+
+
+class S3ArtifactStore:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None):
+        # Optional dependency, only needed when the store is S3.
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self._client_error = ClientError
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest[:2]}/{digest}.zst"
+
+    def refresh(self, digest: str) -> bool:
+        # Objects are expired by a lifecycle rule on the prefix, counted from
+        # their last write. Past half the TTL, a blob referenced again is
+        # rewritten rather than risk it expiring under the new reference.
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except self._client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+        age = time.time() - head["LastModified"].timestamp()
+        return age < settings.artifact_ttl / 2
+
+    def write(self, digest: str, blob: bytes):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(digest),
+            Body=blob,
+            ContentType="application/zstd",
+        )
+
+    def read(self, digest: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+        return response["Body"].read()
+
+
+_store: LocalArtifactStore | S3ArtifactStore | None = None
+_store_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def get_store() -> LocalArtifactStore | S3ArtifactStore:
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            if settings.artifact_store == "s3":
+                _store = S3ArtifactStore(
+                    settings.artifact_s3_bucket,
+                    settings.artifact_s3_prefix,
+                    settings.artifact_s3_endpoint_url,
+                )
+            else:
+                _store = LocalArtifactStore(settings.artifact_dir)
+
+    return _store
+
+
+def put(data: bytes) -> str:
+    # Content-addressed: identical data, e.g. the same flake8 output on two
+    # pushes, is compressed and stored once.
+    digest = hashlib.sha256(data).hexdigest()
+    store = get_store()
+
+    if not store.refresh(digest):
+        # Compressors aren't thread-safe, and LLM workers run many jobs on
+        # threads; a new one per blob is cheap.
+        compressor = zstandard.ZstdCompressor(level=settings.artifact_zstd_level)
+        store.write(digest, compressor.compress(data))
+
+    _maybe_sweep(store)
+    return digest
+
+
+def _maybe_sweep(store: LocalArtifactStore | S3ArtifactStore):
+    global _last_sweep
+
+    if not isinstance(store, LocalArtifactStore):
+        return
+
+    with _store_lock:
+        if time.monotonic() - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = time.monotonic()
+
+    def sweep():
+        try:
+            store.sweep(settings.artifact_ttl, SWEEP_INTERVAL)
+        except OSError as e:
+            logger.warning(f"Couldn't sweep expired artifacts: {e}")
+
+    # Off the job's path; walking a large store takes a while.
+    threading.Thread(target=sweep, name="artifact-sweep", daemon=True).start()
+
+
+def get(digest: str) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(get_store().read(digest))
+
+
+def offload(value: Any) -> Any:
+    # Returns `value` itself if it is small, otherwise a reference to it.
+    data = orjson.dumps(value)
+
+    if len(data) < settings.artifact_inline_max:
+        return value
+
+    return {REF_KEY: put(data), "size": len(data)}
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and REF_KEY in value
+
+
+def resolve(value: Any) -> Any:
+    # The inverse of offload(); anything that isn't a reference is returned
+    # as is, including values from jobs enqueued before offloading existed.
+    if not is_ref(value):
+        return value
+
+    return orjson.loads(get(value[REF_KEY]))
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List
+import orjson
+from redis import Redis
+
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    # Shared across workers. Entries expire after `ttl`; the namespace is also
+    # capped at `max_entries`, evicting the least recently used keys first.
+    def __init__(self, redis: Redis, namespace: str, ttl: int, max_entries: int):
+        self.redis = redis
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lru_key = f"{namespace}:lru"
+        self._stats_key = f"{namespace}:stats"
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get_many(self, keys: List[str]) -> List[Any]:
+        if not keys:
+            return []
+
+        raw = self.redis.mget([self._key(k) for k in keys])
+        values = [orjson.loads(v) if v is not None else None for v in raw]
+        hits = [k for k, v in zip(keys, raw) if v is not None]
+
+        pipe = self.redis.pipeline(transaction=False)
+        if hits:
+            now = time.time()
+            pipe.zadd(self._lru_key, {k: now for k in hits})
+        pipe.hincrby(self._stats_key, "hits", len(hits))
+        pipe.hincrby(self._stats_key, "misses", len(keys) - len(hits))
+        pipe.execute()
+
+        return values
+
+    def set_many(self, mapping: Dict[str, Any]):
+        if not mapping:
+            return
+
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(self._key(key), orjson.dumps(value), ex=self.ttl)
+        pipe.zadd(self._lru_key, {k: now for k in mapping})
+        # Entries that expired on their own are still in the index; drop them so
+        # they don't count against the size cap.
+        pipe.zremrangebyscore(self._lru_key, "-inf", now - self.ttl)
+        pipe.zcard(self._lru_key)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            evicted = self.redis.zpopmin(self._lru_key, size - self.max_entries)
+            if evicted:
+                self.redis.delete(*(self._key(k) for k, _ in evicted))
+
+    def stats(self) -> Dict[str, int]:
+        raw = self.redis.hgetall(self._stats_key)
+        return {
+            "hits": int(raw.get("hits", 0)),
+            "misses": int(raw.get("misses", 0)),
+            "entries": self.redis.zcard(self._lru_key),
+        }
@@ -1,64 +1,247 @@
 import re
-from typing import List, Dict
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 HUNK_HEADER_RE = re.compile(r"^@@\s+-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s+@@")
+# Text is split into lines a chunk at a time, so no full list of lines exists.
+CHUNK_SIZE = 256 * 1024
 
 
-def parse_unified_diff(diff_text: str) -> Dict[str, List[Dict]]:
-    files = {}
-    current_file = None
-    lines = diff_text.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+class Hunk:
+    # One hunk, stored as a single string plus line offsets instead of a list
+    # of per-line strings. `position` is GitHub's diff position of the hunk's
+    # @@ header within its file's patch (0 for the first hunk).
+    __slots__ = (
+        "orig_start",
+        "orig_len",
+        "start",
+        "len",
+        "position",
+        "_body",
+        "_offsets",
+        "_new_index",
+    )
+
+    def __init__(
+        self,
+        orig_start: int,
+        orig_len: int,
+        start: int,
+        length: int,
+        position: int,
+        lines: List[str],
+    ):
+        self.orig_start = orig_start
+        self.orig_len = orig_len
+        self.start = start
+        self.len = length
+        self.position = position
+        self._body = "".join(lines)
+        self._offsets = array("I", accumulate(map(len, lines), initial=0))
+        # For each line of the new file covered by the hunk, the index of the
+        # diff line that holds it ("" is in "+ ", so blank context lines count).
+        self._new_index = array(
+            "I", [i for i, line in enumerate(lines) if line[:1] in "+ "]
+        )
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def line(self, i: int) -> str:
+        return self._body[self._offsets[i] : self._offsets[i + 1]]
+
+    @property
+    def lines(self) -> List[str]:
+        body, offsets = self._body, self._offsets
+        return [body[a:b] for a, b in zip(offsets, offsets[1:])]
+
+    def new_line_count(self) -> int:
+        return len(self._new_index)
+
+    def position_of(self, new_line: int) -> int | None:
+        idx = new_line - self.start
+        if not 0 <= idx < len(self._new_index):
+            return None
+        return self.position + 1 + self._new_index[idx]
+
+    def size(self) -> int:
+        # Characters of the hunk's lines, newlines included.
+        return len(self._body) + len(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "orig_start": self.orig_start,
+            "orig_len": self.orig_len,
+            "start": self.start,
+            "len": self.len,
+            "lines": self.lines,
+        }
+
+
+class DiffIndex:
+    # Maps new-file line numbers of one file to their hunk and diff position
+    # with a binary search over hunk starts.
+    def __init__(self, hunks: List[Hunk]):
+        self.hunks = hunks
+        self._starts = array("I", (h.start for h in hunks))
+
+    def locate(self, new_line: int) -> Tuple[int, int] | None:
+        idx = bisect_right(self._starts, new_line) - 1
+        if idx < 0:
+            return None
+
+        position = self.hunks[idx].position_of(new_line)
+        return (idx, position) if position is not None else None
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    pending = ""
+
+    for chunk in chunks:
+        lines = (pending + chunk).replace("\r\n", "\n").split("\n")
+        pending = lines.pop()
+        yield from lines
+
+    if pending:
+        yield pending
+
+
+def _chunked(text: str) -> Iterator[str]:
+    for i in range(0, len(text), CHUNK_SIZE):
+        yield text[i : i + CHUNK_SIZE]
+
+
+def _header_path(line: str) -> str:
+    # Tools like black append a tab and a timestamp to the path.
+    path = line[4:].split("\t")[0].strip()
+    if path.startswith("b/") or path.startswith("a/"):
+        path = path[2:]
+    return path
+
+
+def _iter_hunks(
+    diff: str | Iterable[str], default_file: str | None
+) -> Iterator[Tuple[str, Tuple[int, int, int, int], int, List[str]]]:
+    # Yields (path, header, position, lines) as soon as each hunk is complete.
+    # `diff` may be the whole text or an iterable of chunks (e.g. a streamed
+    # response), so only the hunk being read is held in memory.
+    #
+    # GitHub's per-file `patch` has no ---/+++ headers; `default_file` names the
+    # file its hunks belong to.
+    current_file = old_file = default_file
+    position = 0
+    header = None
+    body: List[str] = []
+    orig_left = new_left = 0
+
+    for line in _iter_lines(_chunked(diff) if isinstance(diff, str) else diff):
+        if header is not None:
+            # Inside a hunk the header's line counts say where it ends, so
+            # removed lines that happen to start with "--- " stay in the hunk.
+            c = line[:1]
+
+            if c == "\\" or ((orig_left > 0 or new_left > 0) and c != "@"):
+                body.append(line)
+                if c == "+":
+                    new_left -= 1
+                elif c == "-":
+                    orig_left -= 1
+                elif c == " " or c == "":
+                    orig_left -= 1
+                    new_left -= 1
+                continue
+
+            if current_file:
+                yield current_file, header, position, body
+            position += len(body) + 1
+            header, body = None, []
+
         if line.startswith("--- "):
-            a = line[4:].strip()
-            i += 1
-            if i < len(lines) and lines[i].startswith("+++ "):
-                b = lines[i][4:].strip()
-                path = b
-                if path.startswith("b/") or path.startswith("a/"):
-                    path = path[2:]
-                current_file = path
-                files.setdefault(current_file, [])
+            old_file = _header_path(line)
+        elif line.startswith("+++ "):
+            # A deleted file's hunks belong to its old path.
+            path = _header_path(line)
+            current_file = old_file if path == "/dev/null" else path
+            position = 0
         elif line.startswith("@@"):
             m = HUNK_HEADER_RE.match(line)
             if not m:
-                i += 1
                 continue
-            orig_start = int(m.group(1))
-            orig_len = int(m.group(2) or "1")
-            new_start = int(m.group(3))
-            new_len = int(m.group(4) or "1")
-
-            hunk_lines = []
-            i += 1
-            while (
-                i < len(lines)
-                and not lines[i].startswith("@@")
-                and not lines[i].startswith("--- ")
-            ):
-                hunk_lines.append(lines[i])
-                i += 1
-            if current_file:
-                files.setdefault(current_file, []).append(
-                    {
-                        "orig_start": orig_start,
-                        "orig_len": orig_len,
-                        "start": new_start,
-                        "len": new_len,
-                        "lines": hunk_lines,
-                    }
-                )
-            continue
-        else:
-            i += 1
-            continue
+            orig_left = int(m.group(2) or "1")
+            new_left = int(m.group(4) or "1")
+            header = (int(m.group(1)), orig_left, int(m.group(3)), new_left)
+
+    if header is not None and current_file:
+        yield current_file, header, position, body
+
+
+def iter_unified_diff(
+    diff: str | Iterable[str], default_file: str | None = None
+) -> Iterator[Tuple[str, Hunk]]:
+    for path, header, position, lines in _iter_hunks(diff, default_file):
+        yield path, Hunk(*header, position, lines)
+
+
+def parse_unified_diff(
+    diff_text: str, default_file: str | None = None
+) -> Dict[str, List[Dict]]:
+    files: Dict[str, List[Dict]] = {}
+
+    for path, header, _, lines in _iter_hunks(diff_text, default_file):
+        orig_start, orig_len, start, length = header
+        files.setdefault(path, []).append(
+            {
+                "orig_start": orig_start,
+                "orig_len": orig_len,
+                "start": start,
+                "len": length,
+                "lines": lines,
+            }
+        )
+
     return files
 
 
+def index_unified_diff(
+    diff: str | Iterable[str], default_file: str | None = None
+) -> Dict[str, DiffIndex]:
+    hunks: Dict[str, List[Hunk]] = {}
+
+    for path, hunk in iter_unified_diff(diff, default_file=default_file):
+        hunks.setdefault(path, []).append(hunk)
+
+    return {path: DiffIndex(file_hunks) for path, file_hunks in hunks.items()}
+
+
 def trim_text(s: str, max_chars: int = 20_000) -> str:
     if len(s) <= max_chars:
         return s
 
     return s[:max_chars] + "\n...TRUNCATED..."
+
+
+def changed_line_ranges(hunks: List[Dict]) -> List[Tuple[int, int]]:
+    # Inclusive (start, end) runs of lines added in the new file.
+    ranges: List[Tuple[int, int]] = []
+
+    for hunk in hunks:
+        line_no = hunk["start"]
+
+        for line in hunk["lines"]:
+            if line.startswith("+"):
+                if ranges and ranges[-1][1] == line_no - 1:
+                    ranges[-1] = (ranges[-1][0], line_no)
+                else:
+                    ranges.append((line_no, line_no))
+                line_no += 1
+            elif line.startswith(" ") or line == "":
+                line_no += 1
+
+    return ranges
+
+
+def in_ranges(line_no: int, ranges: List[Tuple[int, int]]) -> bool:
+    idx = bisect_right(ranges, (line_no, float("inf"))) - 1
+    return idx >= 0 and ranges[idx][0] <= line_no <= ranges[idx][1]
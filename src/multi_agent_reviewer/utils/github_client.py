@@ -0,0 +1,219 @@
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+import httpx
+import redis as Redis
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+redis = Redis.from_url(settings.redis_url, decode_responses=True)
+
+RATE_LIMIT_PREFIX = "github:ratelimit"
+# Requests authenticated as the app itself (JWT) have their own budget.
+APP_BUCKET = "app"
+
+# GCRA over each bucket's remaining budget, shared by every worker. Requests are
+# spaced so the budget lasts until the reset, with `burst` requests allowed back
+# to back, and nothing is let through while the bucket is blocked after a 403/429.
+# Returns how long the caller has to wait before sending.
+_ACQUIRE = redis.register_script("""
+    local now = tonumber(ARGV[1])
+    local reserve = tonumber(ARGV[2])
+    local burst = tonumber(ARGV[3])
+    local min_interval = tonumber(ARGV[4])
+
+    local state = redis.call("HMGET", KEYS[1], "remaining", "reset", "tat", "blocked_until")
+    local remaining = tonumber(state[1])
+    local reset = tonumber(state[2])
+    local tat = math.max(tonumber(state[3]) or now, now)
+    local start = math.max(now, tonumber(state[4]) or 0)
+    local interval = min_interval
+
+    if remaining and reset and reset > now then
+        if remaining <= reserve then
+            start = math.max(start, reset)
+        else
+            interval = math.max(interval, (reset - now) / (remaining - reserve))
+            redis.call("HSET", KEYS[1], "remaining", remaining - 1)
+        end
+    end
+
+    start = math.max(start, tat - burst * interval)
+    redis.call("HSET", KEYS[1], "tat", math.max(tat, start) + interval)
+    redis.call("EXPIRE", KEYS[1], 2 * 60 * 60)
+    return tostring(start - now)
+    """)
+
+# How many times one job is rescheduled for the rate limit before it falls
+# back to its ordinary retries.
+MAX_RATE_LIMIT_RESCHEDULES = 5
+
+_client: httpx.Client | None = None
+_client_pid: int | None = None
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, bucket: str, wait: float):
+        super().__init__(
+            f"GitHub rate limit for {bucket} exhausted, retry in {wait:.0f}s"
+        )
+        self.bucket = bucket
+        self.wait = wait
+
+
+def retry_when_rate_limited(job, exc_type, exc_value, traceback) -> bool:
+    # An RQ exception handler, run before RQ retries a failed job. Its
+    # retries have no interval, so they would all run while the budget is
+    # still spent; this one is scheduled for when it's back instead, and
+    # doesn't use up one of the job's own retries.
+    if not isinstance(exc_value, RateLimitExceeded):
+        return True
+
+    rescheduled = job.meta.get("rate_limit_reschedules", 0)
+    if rescheduled >= MAX_RATE_LIMIT_RESCHEDULES:
+        return True
+
+    job.meta["rate_limit_reschedules"] = rescheduled + 1
+    job.retries_left = (job.retries_left or 0) + 1
+    # Read from the end of the list, so with one entry it's always this one.
+    job.retry_intervals = [math.ceil(exc_value.wait)]
+    logger.info(
+        f"Job {job.id} hit the GitHub rate limit, retrying in {exc_value.wait:.0f}s"
+    )
+    return True
+
+
+def get_client() -> httpx.Client:
+    global _client, _client_pid
+
+    # One pooled, keep-alive HTTP/2 client per process. Forked workers must
+    # not share the parent's connections.
+    if _client is None or _client_pid != os.getpid():
+        _client = httpx.Client(
+            base_url=settings.github_api_url,
+            http2=True,
+            timeout=20,
+            limits=httpx.Limits(
+                max_connections=settings.github_max_connections,
+                max_keepalive_connections=settings.github_max_connections,
+            ),
+        )
+        _client_pid = os.getpid()
+
+    return _client
+
+
+def _bucket_key(bucket: str) -> str:
+    return f"{RATE_LIMIT_PREFIX}:{bucket}"
+
+
+def _wait_for_budget(bucket: str):
+    wait = float(
+        _ACQUIRE(
+            keys=[_bucket_key(bucket)],
+            args=[
+                time.time(),
+                settings.github_rate_reserve,
+                settings.github_rate_burst,
+                settings.github_min_interval,
+            ],
+        )
+    )
+
+    # Waiting for an hourly reset would just tie up the worker; fail fast and
+    # let retry_when_rate_limited schedule the job for after the reset.
+    if wait > settings.github_max_backoff:
+        raise RateLimitExceeded(bucket, wait)
+
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _record_budget(bucket: str, response: httpx.Response):
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+
+    if remaining is not None and reset is not None:
+        redis.hset(
+            _bucket_key(bucket), mapping={"remaining": remaining, "reset": reset}
+        )
+
+
+def _backoff(response: httpx.Response, attempt: int) -> float | None:
+    # Seconds to back off for a rate-limited response, None if it isn't one.
+    if response.status_code not in (403, 429):
+        return None
+
+    if retry_after := response.headers.get("Retry-After"):
+        return float(retry_after)
+
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return max(0.0, float(response.headers["X-RateLimit-Reset"]) - time.time())
+
+    if response.status_code == 429 or "rate limit" in response.text.lower():
+        # Secondary limits without a Retry-After: wait at least a minute, and
+        # exponentially longer on repeats.
+        return 60.0 * 2**attempt
+
+    return None
+
+
+def _block(bucket: str, method: str, url: str, wait: float):
+    # Block the bucket for every worker, not just this one.
+    redis.hset(_bucket_key(bucket), "blocked_until", time.time() + wait)
+    logger.warning(
+        f"GitHub rate limited {method} {url} for {bucket}, backing off {wait:.0f}s"
+    )
+
+    if wait > settings.github_max_backoff:
+        raise RateLimitExceeded(bucket, wait)
+
+
+def _bucket(installation_id: int | None) -> str:
+    return str(installation_id) if installation_id is not None else APP_BUCKET
+
+
+def request(
+    method: str, url: str, installation_id: int | None = None, **kwargs
+) -> httpx.Response:
+    bucket = _bucket(installation_id)
+
+    for attempt in range(settings.github_max_retries + 1):
+        _wait_for_budget(bucket)
+        response = get_client().request(method, url, **kwargs)
+        _record_budget(bucket, response)
+
+        wait = _backoff(response, attempt)
+        if wait is None:
+            return response
+
+        _block(bucket, method, url, wait)
+
+    return response
+
+
+@contextmanager
+def stream(
+    method: str, url: str, installation_id: int | None = None, **kwargs
+) -> Iterator[httpx.Response]:
+    # Like request(), but the body is left unread for the caller to iterate.
+    bucket = _bucket(installation_id)
+
+    for attempt in range(settings.github_max_retries + 1):
+        _wait_for_budget(bucket)
+
+        with get_client().stream(method, url, **kwargs) as response:
+            _record_budget(bucket, response)
+
+            if response.status_code in (403, 429):
+                response.read()
+
+            wait = _backoff(response, attempt)
+            if wait is None or attempt == settings.github_max_retries:
+                yield response
+                return
+
+        _block(bucket, method, url, wait)
@@ -0,0 +1,106 @@
+from typing import Dict, List, Tuple
+
+# Hunks here are header-only dicts (orig_start, orig_len, start, len), in the
+# shape parse_unified_diff produces.
+
+
+def _new_range(hunk: Dict) -> Tuple[int, int]:
+    return hunk["start"], hunk["start"] + max(hunk["len"], 1) - 1
+
+
+def _overlaps(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+    return a[0] <= b[1] and b[0] <= a[1]
+
+
+def header_only(hunks_by_file: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+    return {
+        path: [
+            {k: h[k] for k in ("orig_start", "orig_len", "start", "len")} for h in hunks
+        ]
+        for path, hunks in hunks_by_file.items()
+    }
+
+
+def restrict_to_delta(
+    changed_hunks: Dict[str, List[Dict]], delta: Dict[str, List[Dict]]
+) -> Dict[str, List[Dict]]:
+    # The PR's hunks that overlap something the push changed. Both sides are
+    # in head line numbers, so files or lines that only came in from merging
+    # the base branch drop out here.
+    restricted = {}
+
+    for path, hunks in changed_hunks.items():
+        touched = [_new_range(h) for h in delta.get(path, [])]
+        kept = [h for h in hunks if any(_overlaps(_new_range(h), r) for r in touched)]
+        if kept:
+            restricted[path] = kept
+
+    return restricted
+
+
+def shift_line(line: int, delta_hunks: List[Dict]) -> int | None:
+    # Maps a line of the previously reviewed head to the new head, or None if
+    # the push changed that line.
+    offset = 0
+
+    for hunk in delta_hunks:
+        if hunk["orig_len"] == 0:
+            # Pure insertion after line `orig_start`.
+            if hunk["orig_start"] >= line:
+                break
+            offset += hunk["len"]
+            continue
+
+        start = hunk["orig_start"]
+        end = start + hunk["orig_len"] - 1
+
+        if line < start:
+            break
+        if line <= end:
+            return None
+
+        offset += hunk["len"] - hunk["orig_len"]
+
+    return line + offset
+
+
+def _carry(items: List[Dict], start_key: str, incremental: Dict) -> List[Dict]:
+    pr_files = set(incremental["pr_files"])
+    reviewed = incremental["reviewed"]
+    delta = incremental["delta"]
+    carried = []
+
+    for item in items:
+        path = item.get("file")
+        if path not in pr_files:
+            continue
+
+        start = shift_line(item[start_key], delta.get(path, []))
+        end = shift_line(item.get("end_line", item[start_key]), delta.get(path, []))
+        if start is None or end is None:
+            continue
+
+        # Re-reviewed hunks produce fresh results that replace these.
+        if any(_overlaps((start, end), _new_range(h)) for h in reviewed.get(path, [])):
+            continue
+
+        moved = {**item, start_key: start}
+        if "end_line" in item:
+            moved["end_line"] = end
+        carried.append(moved)
+
+    return carried
+
+
+def carry_forward(previous_result: Dict | None, incremental: Dict) -> Dict:
+    # Findings and suggestions from the last reviewed head that are still
+    # valid at the new head, moved to their new line numbers.
+    previous_result = previous_result or {}
+    static = previous_result.get("static_checks")
+    findings = static.get("findings", []) if isinstance(static, dict) else []
+    suggestions = previous_result.get("llm_suggestions") or []
+
+    return {
+        "findings": _carry(findings, "line", incremental),
+        "llm_suggestions": _carry(suggestions, "start_line", incremental),
+    }
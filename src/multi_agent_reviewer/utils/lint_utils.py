@@ -0,0 +1,118 @@
+import os
+import re
+from typing import Dict, List, Tuple
+from .diff_utils import in_ranges, iter_unified_diff
+
+# Linter configuration that has to be present next to the changed files.
+LINTER_CONFIG_FILES = ["setup.cfg", "pyproject.toml", ".flake8", "tox.ini"]
+
+FLAKE8_LINE_RE = re.compile(
+    r"^(?P<file>.+?):(?P<line>\d+):(?P<col>\d+): (?P<code>[A-Z]+\d+) (?P<message>.*)$"
+)
+
+MYPY_LINE_RE = re.compile(
+    r"^(?P<file>.+?):(?P<line>\d+):(?:(?P<col>\d+):)? error: (?P<message>.*?)"
+    r"(?:  \[(?P<code>[a-z0-9-]+)\])?$"
+)
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normpath(path)
+
+
+def parse_flake8_output(stdout: str, tool: str = "flake8") -> List[Dict]:
+    # Also used for ruff (concise) and bandit (custom template), which print
+    # the same path:line:col: CODE message lines.
+    findings = []
+
+    for line in stdout.splitlines():
+        m = FLAKE8_LINE_RE.match(line)
+        if not m:
+            continue
+
+        findings.append(
+            {
+                "tool": tool,
+                "file": _normalize_path(m.group("file")),
+                "line": int(m.group("line")),
+                "col": int(m.group("col")),
+                "code": m.group("code"),
+                "message": m.group("message").removeprefix("[*] "),
+            }
+        )
+
+    return findings
+
+
+def parse_mypy_output(stdout: str) -> List[Dict]:
+    findings = []
+
+    for line in stdout.splitlines():
+        m = MYPY_LINE_RE.match(line)
+        if not m:
+            continue
+
+        findings.append(
+            {
+                "tool": "mypy",
+                "file": _normalize_path(m.group("file")),
+                "line": int(m.group("line")),
+                "col": int(m.group("col") or 1),
+                "code": m.group("code") or "mypy",
+                "message": m.group("message"),
+            }
+        )
+
+    return findings
+
+
+def parse_black_diff(stdout: str) -> List[Dict]:
+    # `black --diff` prints a unified diff from the checked-in file to the
+    # formatted one, so the "orig" side of each hunk is in the PR's line numbers.
+    findings = []
+
+    for path, hunk in iter_unified_diff(stdout):
+        line_no = hunk.orig_start
+        reformatted = []
+
+        for line in hunk.lines:
+            if line.startswith("-"):
+                reformatted.append(line_no)
+                line_no += 1
+            elif line.startswith(" ") or line == "":
+                line_no += 1
+
+        if not reformatted:
+            # Pure insertion: attribute it to the line it is inserted at.
+            reformatted = [max(hunk.orig_start, 1)]
+
+        findings.append(
+            {
+                "tool": "black",
+                "file": _normalize_path(path),
+                "line": reformatted[0],
+                "end_line": reformatted[-1],
+                "col": 1,
+                "code": "BLK100",
+                "message": "Black would reformat this code",
+            }
+        )
+
+    return findings
+
+
+def filter_to_changed_lines(
+    findings: List[Dict], ranges_by_file: Dict[str, List[Tuple[int, int]]]
+) -> List[Dict]:
+    scoped = []
+
+    for finding in findings:
+        ranges = ranges_by_file.get(finding["file"])
+        if not ranges:
+            continue
+
+        end_line = finding.get("end_line", finding["line"])
+        if any(in_ranges(n, ranges) for n in range(finding["line"], end_line + 1)):
+            scoped.append(finding)
+
+    return scoped
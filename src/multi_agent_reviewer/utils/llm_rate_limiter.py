@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+import redis as Redis
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+redis = Redis.from_url(settings.redis_url, decode_responses=True)
+
+BUCKET_KEY = "llm:ratelimit"
+
+# Two token buckets in one hash, shared by every LLM worker: one holding
+# requests, one holding tokens, each refilling to a minute's quota over a
+# minute. Callers reserve their cost up front, driving the buckets negative if
+# need be, and wait out the deficit, so requests go out in arrival order and
+# large prompts aren't starved by small ones. A dry run only reports how long
+# until the buckets are out of debt. Returns how long the caller has to wait.
+_ACQUIRE = redis.register_script("""
+    local now = tonumber(ARGV[1])
+    local rpm = tonumber(ARGV[2])
+    local tpm = tonumber(ARGV[3])
+    local cost = math.min(tonumber(ARGV[4]), tpm)
+    local dry_run = ARGV[5] == "1"
+
+    local state = redis.call("HMGET", KEYS[1], "requests", "tokens", "ts")
+    local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+    local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+    local tokens = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+
+    if dry_run then
+        local wait = math.max(0, -requests * 60 / rpm, -tokens * 60 / tpm)
+        return tostring(wait)
+    end
+
+    requests = requests - 1
+    tokens = tokens - cost
+    redis.call("HSET", KEYS[1], "requests", requests, "tokens", tokens, "ts", now)
+    redis.call("EXPIRE", KEYS[1], 60 * 60)
+
+    return tostring(math.max(0, -requests * 60 / rpm, -tokens * 60 / tpm))
+    """)
+
+
+def _reserve(tokens: int, dry_run: bool = False) -> float:
+    return float(
+        _ACQUIRE(
+            keys=[BUCKET_KEY],
+            args=[
+                time.time(),
+                settings.llm_rpm,
+                settings.llm_tpm,
+                tokens,
+                "1" if dry_run else "0",
+            ],
+        )
+    )
+
+
+async def acquire(tokens: int):
+    # Takes one request and `tokens` tokens from the shared quota, sleeping
+    # until they are actually available.
+    wait = await asyncio.to_thread(_reserve, tokens)
+
+    if wait > 0:
+        logger.debug(f"LLM rate limit: waiting {wait:.1f}s for {tokens} tokens")
+        await asyncio.sleep(wait)
+
+
+async def settle(estimated: int, used: int):
+    # Corrects a reservation made with an estimate once the provider reports
+    # what the call really cost. Refills are capped on the next acquire.
+    if used != estimated:
+        await asyncio.to_thread(
+            redis.hincrbyfloat, BUCKET_KEY, "tokens", estimated - used
+        )
+
+
+def wait_for_capacity():
+    # Backpressure for workers: blocks while the quota is spent, so jobs stay
+    # on the queue instead of piling up behind the limiter.
+    while (wait := _reserve(0, dry_run=True)) > 0:
+        time.sleep(min(wait, 5))
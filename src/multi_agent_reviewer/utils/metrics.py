@@ -0,0 +1,248 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+from redis import Redis
+from redis import asyncio as aioredis
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Each metric is one Redis hash that every worker increments, so /metrics sees
+# the totals across all of them. Fields are "<labels>|<bucket>", "<labels>|sum"
+# and "<labels>|count", with <labels> already in exposition format.
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    global _redis
+
+    if _redis is None:
+        _redis = Redis.from_url(settings.redis_url, decode_responses=True)
+
+    return _redis
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _series(name: str, labels: str, extra: str = "") -> str:
+    inner = ",".join(part for part in (labels, extra) if part)
+    return f"{name}{{{inner}}}" if inner else name
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.key = f"{PREFIX}:{name}"
+
+    def observe(self, value: float, **labels):
+        # Best effort: a Redis hiccup must never fail the job being measured.
+        key = _labels(labels)
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(self.key, f"{key}|{bisect_left(self.buckets, value)}", 1)
+        pipe.hincrbyfloat(self.key, f"{key}|sum", value)
+        pipe.hincrby(self.key, f"{key}|count", 1)
+
+        try:
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Couldn't record {self.name}: {e}")
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self, raw: Dict[str, str]) -> List[str]:
+        series: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for field, value in raw.items():
+            labels, _, part = field.rpartition("|")
+            series[labels][part] = float(value)
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, parts in sorted(series.items()):
+            # Buckets are stored per interval; Prometheus wants them cumulative.
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += parts.get(str(i), 0)
+                le = f'le="{_number(bound)}"'
+                lines.append(
+                    f"{_series(self.name + '_bucket', labels, le)} {_number(cumulative)}"
+                )
+            count = _number(parts.get("count", 0))
+            inf = _series(self.name + "_bucket", labels, 'le="+Inf"')
+            lines.append(f"{inf} {count}")
+            lines.append(
+                f"{_series(self.name + '_sum', labels)} {_number(parts.get('sum', 0))}"
+            )
+            lines.append(f"{_series(self.name + '_count', labels)} {count}")
+
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.key = f"{PREFIX}:{name}"
+
+    def inc(self, amount: int = 1, **labels):
+        try:
+            get_redis().hincrby(self.key, _labels(labels), amount)
+        except Exception as e:
+            logger.warning(f"Couldn't record {self.name}: {e}")
+
+    def render(self, raw: Dict[str, str]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(raw.items()):
+            lines.append(f"{_series(self.name, labels)} {_number(float(value))}")
+        return lines
+
+
+SECONDS_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(4**i * 1024 for i in range(10))  # 1 KiB to 256 MiB
+TOKENS_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+STAGE_SECONDS = Histogram(
+    "review_stage_duration_seconds",
+    "Time spent in each stage of a review.",
+    SECONDS_BUCKETS,
+)
+STAGE_BYTES = Histogram(
+    "review_stage_bytes",
+    "Size of what a stage handled: the hunks kept for review, or what a clone added to its mirror.",
+    BYTES_BUCKETS,
+)
+ANALYZER_SECONDS = Histogram(
+    "analyzer_duration_seconds",
+    "Time each static analyzer took on the files it was given.",
+    SECONDS_BUCKETS,
+)
+LLM_TOKENS = Histogram(
+    "llm_tokens",
+    "Prompt and completion tokens per LLM call, as reported by the provider.",
+    TOKENS_BUCKETS,
+)
+JOB_FAILURES = Counter(
+    "rq_job_failures_total",
+    "Job attempts that raised, retried ones included.",
+)
+
+METRICS = [STAGE_SECONDS, STAGE_BYTES, ANALYZER_SECONDS, LLM_TOKENS, JOB_FAILURES]
+
+# RQ's own keys, read directly so the API never has to import rq.
+QUEUE_STATES = {
+    "queued": "rq:queue:{0}",
+    "started": "rq:wip:{0}",
+    "deferred": "rq:deferred:{0}",
+    "scheduled": "rq:scheduled:{0}",
+    "failed": "rq:failed:{0}",
+}
+
+# RedisCache keeps its hit/miss counters in "<namespace>:stats"; they're read
+# directly too, so the API doesn't import the services that own the caches.
+CACHE_STATS = ("llm:cache:stats", "analyzer:cache:*:stats")
+
+
+def record_failure(job, exc_type, exc_value, traceback) -> bool:
+    # An RQ exception handler; returning True lets RQ's own handling go on.
+    try:
+        function = job.func_name.rsplit(".", 1)[-1]
+    except Exception:
+        function = "<unknown>"
+
+    JOB_FAILURES.inc(queue=job.origin, function=function, error=exc_type.__name__)
+    return True
+
+
+async def _queue_lines(redis: aioredis.Redis) -> List[str]:
+    names = sorted(
+        key.removeprefix("rq:queue:") for key in await redis.smembers("rq:queues")
+    )
+
+    pipe = redis.pipeline(transaction=False)
+    for name in names:
+        pipe.llen(QUEUE_STATES["queued"].format(name))
+        for state, key in QUEUE_STATES.items():
+            if state != "queued":
+                pipe.zcard(key.format(name))
+    pipe.scard("rq:workers")
+    counts = await pipe.execute()
+
+    lines = [
+        "# HELP rq_queue_jobs Jobs in each queue and registry right now.",
+        "# TYPE rq_queue_jobs gauge",
+    ]
+    i = 0
+    for name in names:
+        for state in QUEUE_STATES:
+            labels = _labels({"queue": name, "state": state})
+            lines.append(f"{_series('rq_queue_jobs', labels)} {counts[i]}")
+            i += 1
+
+    lines += [
+        "# HELP rq_workers Registered RQ workers.",
+        "# TYPE rq_workers gauge",
+        f"rq_workers {counts[-1]}",
+    ]
+    return lines
+
+
+async def _cache_lines(redis: aioredis.Redis) -> List[str]:
+    keys = []
+    for pattern in CACHE_STATS:
+        keys += sorted([key async for key in redis.scan_iter(match=pattern)])
+
+    pipe = redis.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    raws = await pipe.execute() if keys else []
+
+    lines = []
+    for result, help in (("hits", "found an entry"), ("misses", "found nothing")):
+        name = f"cache_{result}_total"
+        lines += [
+            f"# HELP {name} Cache lookups that {help}.",
+            f"# TYPE {name} counter",
+        ]
+        for key, raw in zip(keys, raws):
+            labels = _labels({"cache": key.removesuffix(":stats")})
+            lines.append(f"{_series(name, labels)} {int(raw.get(result, 0))}")
+
+    return lines
+
+
+async def collect(redis: aioredis.Redis) -> str:
+    # Renders every metric in Prometheus' text format.
+    pipe = redis.pipeline(transaction=False)
+    for metric in METRICS:
+        pipe.hgetall(metric.key)
+    raws = await pipe.execute()
+
+    lines = []
+    for metric, raw in zip(METRICS, raws):
+        lines += metric.render(raw)
+    lines += await _cache_lines(redis)
+    lines += await _queue_lines(redis)
+
+    return "\n".join(lines) + "\n"
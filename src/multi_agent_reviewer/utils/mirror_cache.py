@@ -0,0 +1,243 @@
+import base64
+import fcntl
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List
+from ..config import settings
+from .metrics import STAGE_BYTES, STAGE_SECONDS
+from .utils import run_command
+
+logger = logging.getLogger(__name__)
+
+MIRRORS_DIR = os.path.join(settings.mirror_cache_dir, "mirrors")
+WORKTREES_DIR = os.path.join(settings.mirror_cache_dir, "worktrees")
+
+
+PARTIAL_CLONE_CONFIG = (
+    ("core.repositoryformatversion", "1"),
+    ("extensions.partialClone", "origin"),
+    ("remote.origin.promisor", "true"),
+    ("remote.origin.partialclonefilter", "blob:none"),
+)
+
+
+def _mirror_path(slug: str) -> str:
+    return os.path.join(MIRRORS_DIR, slug.replace("/", "__") + ".git")
+
+
+@contextmanager
+def _locked(mirror: str, blocking: bool = True) -> Iterator[None]:
+    # flock is released when the fd is closed, including when the process dies,
+    # so a crashed job can never leave a mirror locked.
+    fd = os.open(mirror + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _auth_args(token: str) -> List[str]:
+    # Pass the token per command instead of embedding it in the remote URL, so
+    # it never ends up in the mirror's config on disk.
+    basic = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    return ["-c", f"http.extraHeader=Authorization: Basic {basic}"]
+
+
+def _git(
+    args: List[str], cwd: str, token: str | None = None, input: str | None = None
+) -> dict:
+    auth = _auth_args(token) if token else []
+    res = run_command(["git", *auth, *args], cwd=cwd, input=input)
+
+    if res["returncode"] != 0:
+        raise RuntimeError(f"git {args[0]} failed: {res['stderr']}")
+
+    return res
+
+
+def _has_commit(mirror: str, sha: str) -> bool:
+    res = run_command(["git", "cat-file", "-e", f"{sha}^{{commit}}"], cwd=mirror)
+    return res["returncode"] == 0
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _record_size(mirror: str) -> int:
+    size = _dir_size(mirror)
+    with open(mirror + ".size", "w") as f:
+        f.write(str(size))
+    return size
+
+
+def _read_size(mirror: str) -> int:
+    try:
+        with open(mirror + ".size") as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return _dir_size(mirror)
+
+
+def _has_worktrees(mirror: str) -> bool:
+    admin = os.path.join(mirror, "worktrees")
+    return os.path.isdir(admin) and bool(os.listdir(admin))
+
+
+def _ensure_mirror(mirror: str, url: str):
+    if not os.path.isdir(os.path.join(mirror, "objects")):
+        shutil.rmtree(mirror, ignore_errors=True)
+        _git(["init", "--bare", mirror], cwd=MIRRORS_DIR)
+        _git(["remote", "add", "origin", url], cwd=mirror)
+        _git(["config", "user.email", "multi-agent-reviewer@bot.com"], cwd=mirror)
+        _git(["config", "user.name", "review-bot"], cwd=mirror)
+
+    # Mirrors are blobless partial clones: fetches only bring commits and trees,
+    # and checkouts lazily fetch the blobs they actually materialize. Applied
+    # on every use so mirrors created as full clones get converted too.
+    for key, value in PARTIAL_CLONE_CONFIG:
+        _git(["config", key, value], cwd=mirror)
+
+
+def checkout_worktree(
+    slug: str,
+    url: str,
+    head_sha: str,
+    token: str,
+    depth: int = 1,
+    paths: List[str] | None = None,
+) -> str:
+    os.makedirs(MIRRORS_DIR, exist_ok=True)
+    os.makedirs(WORKTREES_DIR, exist_ok=True)
+
+    mirror = _mirror_path(slug)
+    name = slug.rsplit("/", 1)[-1]
+    worktree = os.path.join(
+        WORKTREES_DIR, f"{name}-{head_sha[:12]}-{uuid.uuid4().hex[:8]}"
+    )
+
+    started = time.perf_counter()
+
+    with _locked(mirror):
+        _ensure_mirror(mirror, url)
+        size = _read_size(mirror)
+
+        if not _has_commit(mirror, head_sha):
+            logger.info(f"Fetching {head_sha} into mirror {mirror}")
+            # Fetching into a ref keeps the commit reachable, so gc won't prune
+            # it and later fetches can negotiate against it.
+            fetch = [
+                "fetch",
+                "--no-tags",
+                "origin",
+                f"+{head_sha}:refs/reviews/{head_sha}",
+            ]
+            if depth:
+                fetch[1:1] = ["--depth", str(depth)]
+            _git(fetch, cwd=mirror, token=token)
+
+        # Checkouts may lazily fetch missing blobs, so they need auth as well.
+        if paths is None:
+            _git(
+                ["worktree", "add", "--detach", worktree, head_sha],
+                cwd=mirror,
+                token=token,
+            )
+        else:
+            _sparse_worktree(mirror, worktree, head_sha, token, paths)
+
+        # What the fetch and the lazily fetched blobs added to the mirror.
+        fetched = max(0, _record_size(mirror) - size)
+        # The lock file's mtime doubles as the mirror's last-used time for LRU.
+        os.utime(mirror + ".lock")
+
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="clone")
+    STAGE_BYTES.observe(fetched, stage="clone")
+
+    evict(settings.mirror_cache_max_bytes)
+    return worktree
+
+
+def _sparse_worktree(
+    mirror: str, worktree: str, head_sha: str, token: str, paths: List[str]
+):
+    _git(
+        ["worktree", "add", "--no-checkout", "--detach", worktree, head_sha], cwd=mirror
+    )
+
+    # Non-cone patterns anchored at the root match exactly the listed files;
+    # glob characters in file names are escaped so they match literally.
+    patterns = "".join(
+        "/" + re.sub(r"([\\*?\[!#])", r"\\\1", path.lstrip("/")) + "\n"
+        for path in paths
+    )
+    _git(
+        ["sparse-checkout", "set", "--no-cone", "--stdin"], cwd=worktree, input=patterns
+    )
+    _git(["reset", "--quiet", "--hard", head_sha], cwd=worktree, token=token)
+
+
+def remove_worktree(worktree: str):
+    if not os.path.isdir(worktree):
+        return
+
+    res = run_command(["git", "rev-parse", "--git-common-dir"], cwd=worktree)
+    mirror = os.path.abspath(os.path.join(worktree, res["stdout"].strip()))
+
+    if res["returncode"] != 0 or not os.path.isdir(mirror):
+        shutil.rmtree(worktree, ignore_errors=True)
+        return
+
+    with _locked(mirror):
+        run_command(["git", "worktree", "remove", "--force", worktree], cwd=mirror)
+        shutil.rmtree(worktree, ignore_errors=True)
+        run_command(["git", "worktree", "prune"], cwd=mirror)
+
+
+def evict(max_bytes: int):
+    if not os.path.isdir(MIRRORS_DIR):
+        return
+
+    mirrors = []
+    for entry in os.listdir(MIRRORS_DIR):
+        if not entry.endswith(".git"):
+            continue
+        mirror = os.path.join(MIRRORS_DIR, entry)
+        try:
+            last_used = os.path.getmtime(mirror + ".lock")
+        except OSError:
+            last_used = 0
+        mirrors.append((last_used, mirror, _read_size(mirror)))
+
+    total = sum(size for _, _, size in mirrors)
+
+    for _, mirror, size in sorted(mirrors):
+        if total <= max_bytes:
+            break
+
+        try:
+            with _locked(mirror, blocking=False):
+                # Never evict a mirror that still backs a live worktree.
+                if _has_worktrees(mirror):
+                    continue
+
+                logger.info(f"Evicting mirror {mirror} ({size} bytes)")
+                shutil.rmtree(mirror, ignore_errors=True)
+                if os.path.exists(mirror + ".size"):
+                    os.remove(mirror + ".size")
+                total -= size
+        except BlockingIOError:
+            continue
@@ -0,0 +1,83 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+# Rough English/code average for GPT-style BPE tokenizers. Budgets leave
+# headroom, so an estimate is enough and avoids shipping a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def render_hunk(hunk: Dict) -> str:
+    header = (
+        f"@@ -{hunk['orig_start']},{hunk['orig_len']} "
+        f"+{hunk['start']},{hunk['len']} @@"
+    )
+    return "\n".join([header, *hunk["lines"]]) + "\n"
+
+
+def render_hunks(hunks_by_file: Dict[str, List[Dict]]) -> str:
+    return "".join(
+        f"--- a/{path}\n+++ b/{path}\n" + "".join(render_hunk(h) for h in hunks)
+        for path, hunks in hunks_by_file.items()
+        if hunks
+    )
+
+
+@dataclass
+class PromptBatch:
+    hunks: Dict[str, List[Dict]] = field(default_factory=dict)
+    tokens: int = 0
+
+    def add(self, path: str, hunk: Dict, tokens: int):
+        self.hunks.setdefault(path, []).append(hunk)
+        self.tokens += tokens
+
+
+def _file_header_tokens(path: str) -> int:
+    return estimate_tokens(f"--- a/{path}\n+++ b/{path}\n")
+
+
+def plan_batches(
+    changed_hunks: Dict[str, List[Dict]], budget: int
+) -> List[PromptBatch]:
+    # Packs hunks into batches of at most `budget` estimated tokens. Whole
+    # files are placed first-fit decreasing, so a file's hunks share a prompt
+    # whenever the file fits in one; larger files are split at hunk
+    # boundaries. A single hunk over budget gets a batch of its own.
+    files = []
+    for path, hunks in changed_hunks.items():
+        hunk_tokens = [estimate_tokens(render_hunk(h)) for h in hunks]
+        if hunk_tokens:
+            total = _file_header_tokens(path) + sum(hunk_tokens)
+            files.append((total, path, hunks, hunk_tokens))
+
+    files.sort(key=lambda f: f[0], reverse=True)
+    batches: List[PromptBatch] = []
+
+    for total, path, hunks, hunk_tokens in files:
+        if total <= budget:
+            batch = next((b for b in batches if b.tokens + total <= budget), None)
+            if batch is None:
+                batch = PromptBatch()
+                batches.append(batch)
+
+            batch.tokens += _file_header_tokens(path)
+            for hunk, tokens in zip(hunks, hunk_tokens):
+                batch.add(path, hunk, tokens)
+            continue
+
+        batch = PromptBatch()
+        batches.append(batch)
+        for hunk, tokens in zip(hunks, hunk_tokens):
+            if path in batch.hunks and batch.tokens + tokens > budget:
+                batch = PromptBatch()
+                batches.append(batch)
+            if path not in batch.hunks:
+                batch.tokens += _file_header_tokens(path)
+            batch.add(path, hunk, tokens)
+
+    return batches
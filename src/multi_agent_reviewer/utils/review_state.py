@@ -0,0 +1,107 @@
+import json
+import logging
+from redis import Redis
+from rq.exceptions import InvalidJobOperation, NoSuchJobError
+from rq.job import Job, JobStatus
+from ..config import settings
+
+LATEST_PREFIX = "review:latest"
+PIPELINE_PREFIX = "review:pipeline"
+
+LATEST_TTL = 24 * 60 * 60
+PIPELINE_TTL = 30 * 60
+
+redis = Redis.from_url(settings.redis_url, decode_responses=True)
+# RQ stores pickled job data, so job lookups need a connection that doesn't decode.
+rq_redis = Redis.from_url(settings.redis_url)
+logger = logging.getLogger(__name__)
+
+# Only drop the pipeline record if it still belongs to the given head_sha, so a
+# finishing stale pipeline can't clear the record of the one that replaced it.
+_CLEAR_PIPELINE = redis.register_script("""
+    local current = redis.call("GET", KEYS[1])
+    if current and cjson.decode(current)["head_sha"] == ARGV[1] then
+        return redis.call("DEL", KEYS[1])
+    end
+    return 0
+    """)
+
+
+class Superseded(Exception):
+    # Raised inside a stage to abandon work for a push that is no longer the
+    # PR's latest.
+    pass
+
+
+def latest_key(owner: str, repo: str, pr_number: int) -> str:
+    return f"{LATEST_PREFIX}:{owner}:{repo}:{pr_number}"
+
+
+def pipeline_key(owner: str, repo: str, pr_number: int) -> str:
+    return f"{PIPELINE_PREFIX}:{owner}:{repo}:{pr_number}"
+
+
+def is_superseded(payload: dict) -> bool:
+    latest = redis.get(latest_key(payload["owner"], payload["repo"], payload["pr"]))
+    return latest is not None and latest != payload["head_sha"]
+
+
+def get_pipeline(owner: str, repo: str, pr_number: int) -> dict | None:
+    current = redis.get(pipeline_key(owner, repo, pr_number))
+    return json.loads(str(current)) if current else None
+
+
+def swap_pipeline(
+    owner: str,
+    repo: str,
+    pr_number: int,
+    head_sha: str,
+    task_id: int,
+    job_ids: list[str],
+) -> dict | None:
+    record = {"head_sha": head_sha, "task_id": task_id, "job_ids": job_ids}
+    previous = redis.set(
+        pipeline_key(owner, repo, pr_number),
+        json.dumps(record),
+        ex=PIPELINE_TTL,
+        get=True,
+    )
+    return json.loads(str(previous)) if previous else None
+
+
+def clear_pipeline(owner: str, repo: str, pr_number: int, head_sha: str):
+    _CLEAR_PIPELINE(keys=[pipeline_key(owner, repo, pr_number)], args=[head_sha])
+
+
+def cancel_pipeline(pipeline: dict):
+    # Jobs still waiting are cancelled. Running ones can't be stopped from
+    # outside, as the workers run jobs in their own process; they check
+    # is_superseded() between steps and return early instead.
+    for job_id in pipeline["job_ids"]:
+        try:
+            job = Job.fetch(job_id, connection=rq_redis)
+        except NoSuchJobError:
+            continue
+
+        status = job.get_status()
+
+        if status == JobStatus.STARTED:
+            logger.info(
+                f"Job {job_id} for superseded commit {pipeline['head_sha']} is "
+                f"running, it will stop at its next check"
+            )
+            continue
+
+        if status not in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED):
+            continue
+
+        try:
+            job.cancel()
+        except InvalidJobOperation as e:
+            # The job started or finished between the status check and now.
+            logger.info(f"Could not cancel job {job_id}: {e}")
+            continue
+
+        logger.info(
+            f"Cancelled job {job_id} for superseded commit {pipeline['head_sha']}"
+        )
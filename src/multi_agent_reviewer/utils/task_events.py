@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Set, Tuple
+import orjson
+from redis import Redis
+from redis import asyncio as aioredis
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "task"
+# Statuses after which a task publishes nothing more.
+TERMINAL = ("COMPLETED", "FAILED", "SUPERSEDED")
+
+# Workers append each event to a capped per-task list and publish it on a
+# channel of the same name. Entries are "<id> <json>", ids counting up from 1
+# per task, so a stream can replay the list and then follow the channel
+# without gaps or repeats. The state hash is the latest status and stage.
+_PUBLISH = """
+    local id = redis.call("INCR", KEYS[1])
+    local entry = id .. " " .. ARGV[1]
+    local ttl = tonumber(ARGV[2])
+
+    redis.call("RPUSH", KEYS[2], entry)
+    redis.call("LTRIM", KEYS[2], -tonumber(ARGV[3]), -1)
+    redis.call("HSET", KEYS[3], "last_event_id", id, unpack(ARGV, 4))
+    for _, key in ipairs(KEYS) do
+        redis.call("EXPIRE", key, ttl)
+    end
+    redis.call("PUBLISH", KEYS[2], entry)
+
+    return id
+    """
+
+# Made on first use, so the API can import this module without Redis set up.
+_redis: Redis | None = None
+_publish = None
+
+
+def _script():
+    global _redis, _publish
+
+    if _publish is None:
+        _redis = Redis.from_url(settings.redis_url, decode_responses=True)
+        _publish = _redis.register_script(_PUBLISH)
+
+    return _publish
+
+
+def events_key(task_id: int) -> str:
+    return f"{PREFIX}:{task_id}:events"
+
+
+def state_key(task_id: int) -> str:
+    return f"{PREFIX}:{task_id}:state"
+
+
+def _seq_key(task_id: int) -> str:
+    return f"{PREFIX}:{task_id}:seq"
+
+
+def publish(task_id: int | None, kind: str, state: dict | None = None, **data):
+    # Best effort, like metrics: watchers missing an event must never fail the
+    # review. Jobs enqueued before tasks had events carry no task id.
+    if task_id is None:
+        return
+
+    now = time.time()
+    fields = {k: v for k, v in (state or {}).items() if v is not None}
+    fields["updated_at"] = now
+    event = {"type": kind, "ts": now, **data}
+
+    try:
+        _script()(
+            keys=[_seq_key(task_id), events_key(task_id), state_key(task_id)],
+            args=[
+                orjson.dumps(event),
+                settings.task_events_ttl,
+                settings.task_events_max,
+                *(x for item in fields.items() for x in item),
+            ],
+        )
+    except Exception as e:
+        logger.warning(f"Couldn't publish {kind} event for task {task_id}: {e}")
+
+
+def set_status(task_id: int | None, status: str, **data):
+    publish(task_id, "status", {"status": status}, status=status, **data)
+
+
+def set_stage(job, task_id: int | None, stage: str, **data):
+    # Keeps job.meta["stage"] for RQ tooling and tells the task's watchers.
+    job.meta["stage"] = stage
+    job.save_meta()
+    publish(task_id, "stage", {"stage": stage}, stage=stage, **data)
+
+
+def parse(entry: str) -> Tuple[int, dict]:
+    event_id, _, event = entry.partition(" ")
+    return int(event_id), orjson.loads(event)
+
+
+def format_sse(event_id: int, event: dict) -> str:
+    data = orjson.dumps(event).decode()
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class EventHub:
+    # One pattern subscription per API process, fanned out to every stream
+    # watching a task, instead of a Redis connection per connected client.
+    # Events for tasks nobody here watches are dropped.
+    def __init__(self, max_backlog: int = 256):
+        self.max_backlog = max_backlog
+        self._streams: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._reader: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+
+    async def subscribe(self, redis: aioredis.Redis, task_id: int) -> asyncio.Queue:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read(redis))
+
+        await asyncio.wait_for(self._ready.wait(), timeout=5)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_backlog)
+        self._streams[task_id].add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: int, queue: asyncio.Queue):
+        streams = self._streams.get(task_id)
+
+        if streams is not None:
+            streams.discard(queue)
+            if not streams:
+                del self._streams[task_id]
+
+    def _close_all(self):
+        for streams in self._streams.values():
+            for queue in streams:
+                self._close(queue)
+        self._streams.clear()
+
+    def _close(self, queue: asyncio.Queue):
+        # None ends the stream; the client reconnects with Last-Event-ID and
+        # catches up from the event list.
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _dispatch(self, channel: str, entry: str):
+        task_id = int(channel.split(":")[1])
+
+        for queue in list(self._streams.get(task_id, ())):
+            try:
+                queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                logger.info(f"Event stream for task {task_id} fell behind, closing it")
+                self.unsubscribe(task_id, queue)
+                self._close(queue)
+
+    async def _read(self, redis: aioredis.Redis):
+        while True:
+            pubsub = redis.pubsub()
+
+            try:
+                await pubsub.psubscribe(events_key("*"))
+
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"], message["data"])
+                    elif message["type"] == "psubscribe":
+                        # Only now is every new event certain to reach us.
+                        self._ready.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Task event subscription lost: {e}")
+            finally:
+                # Anything published while disconnected is only in the lists.
+                self._ready.clear()
+                self._close_all()
+                await pubsub.aclose()
+
+            await asyncio.sleep(1)
+
+
+hub = EventHub()
+
+
+async def _entries(
+    redis: aioredis.Redis, task_id: int, queue: asyncio.Queue
+) -> AsyncIterator[str]:
+    # The stored events, then live ones; "" whenever nothing happened for a
+    # while.
+    for entry in await redis.lrange(events_key(task_id), 0, -1):
+        yield entry
+
+    while True:
+        try:
+            entry = await asyncio.wait_for(
+                queue.get(), timeout=settings.task_events_keepalive
+            )
+        except asyncio.TimeoutError:
+            yield ""
+            continue
+
+        if entry is None:
+            return
+        yield entry
+
+
+async def stream(
+    redis: aioredis.Redis, task_id: int, last_id: int = 0
+) -> AsyncIterator[str]:
+    # Replays the events after `last_id`, then follows new ones live until the
+    # task reaches a terminal status. Subscribes before reading the stored
+    # events, so nothing falls in between; events seen twice are skipped by id.
+    queue = await hub.subscribe(redis, task_id)
+
+    try:
+        async for entry in _entries(redis, task_id, queue):
+            if not entry:
+                # Keeps proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+                continue
+
+            event_id, event = parse(entry)
+            if event_id <= last_id:
+                continue
+
+            yield format_sse(event_id, event)
+            last_id = event_id
+            if event.get("status") in TERMINAL:
+                return
+    finally:
+        hub.unsubscribe(task_id, queue)
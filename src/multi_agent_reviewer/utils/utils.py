@@ -1,10 +1,10 @@
 from typing import List
 
 
-def run_command(cmd: List[str], cwd: str) -> dict:
+def run_command(cmd: List[str], cwd: str, input: str | None = None) -> dict:
     import subprocess
 
-    proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    proc = subprocess.run(cmd, cwd=cwd, input=input, capture_output=True, text=True)
     return {
         "stdout": proc.stdout,
         "stderr": proc.stderr,
@@ -0,0 +1,86 @@
+from rq import SimpleWorker, Queue
+from rq.timeouts import TimerDeathPenalty
+from multi_agent_reviewer.config import settings
+
+# Imported under the same name the jobs are enqueued with, so the client
+# warmed here is the one the jobs use.
+from multi_agent_reviewer.services import llm_review_agent
+from multi_agent_reviewer.utils.llm_rate_limiter import wait_for_capacity
+from multi_agent_reviewer.utils.metrics import record_failure
+from redis import Redis
+import threading
+import signal
+import logging
+
+redis_conn = Redis.from_url(settings.redis_url)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_QUEUE = "llm"
+
+
+class LLMThreadWorker(SimpleWorker):
+    # RQ tracks the current job per worker, so each concurrent review gets a
+    # worker of its own on a thread. The threads only hold RQ's bookkeeping;
+    # the LLM calls themselves all run on the process's shared event loop.
+    death_penalty_class = TimerDeathPenalty
+
+    def _install_signal_handlers(self):
+        # Signals can only be handled on the main thread, which stops us.
+        pass
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        # Dequeues one blocking timeout at a time, so an idle worker sees a
+        # stop request, and leaves jobs on the queue for other workers while
+        # the quota is spent.
+        while not self._stop_requested:
+            wait_for_capacity()
+            result = super().dequeue_job_and_maintain_ttl(timeout, timeout)
+            if result is not None:
+                return result
+        return None
+
+
+def run_llm_worker():
+    queue = Queue(LLM_QUEUE, connection=redis_conn)
+    # Start the shared loop and client before the first job needs them.
+    llm_review_agent.get_llm()
+
+    # A short TTL keeps the blocking dequeue short, so idle workers notice a
+    # stop request within seconds.
+    workers = [
+        LLMThreadWorker(
+            [queue],
+            connection=redis_conn,
+            worker_ttl=20,
+            exception_handlers=[record_failure],
+        )
+        for _ in range(settings.llm_worker_concurrency)
+    ]
+    threads = [
+        threading.Thread(target=worker.work, name=worker.name) for worker in workers
+    ]
+
+    def _graceful(signum, frame):
+        logger.info("Received signal %s, shutting down gracefully...", signum)
+        # Workers finish the review they are on, then exit.
+        for worker in workers:
+            worker._stop_requested = True
+
+    signal.signal(signal.SIGTERM, _graceful)
+    signal.signal(signal.SIGINT, _graceful)
+
+    for thread in threads:
+        thread.start()
+
+    logger.info(f"LLM worker running {len(workers)} reviews at a time")
+
+    for thread in threads:
+        # join() with a timeout so the main thread keeps handling signals.
+        while thread.is_alive():
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    run_llm_worker()
@@ -1,28 +1,132 @@
-from rq import Worker, Queue
-from src.multi_agent_reviewer.config import settings
+from rq import SimpleWorker, Queue
+from multi_agent_reviewer.config import settings
 from redis import Redis
+import importlib
 import signal
 import logging
 import os
-
-redis_conn = Redis.from_url(settings.redis_url)
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Every module a job on the default queue can name, imported under the same
+# names the jobs use so they find them already loaded.
+JOB_MODULES = [
+    "multi_agent_reviewer.services.start_review_agent",
+    "multi_agent_reviewer.services.static_check_agent",
+    "multi_agent_reviewer.services.llm_review_agent",
+    "multi_agent_reviewer.services.finalizer_agent",
+]
+
+
+def preload():
+    # Importing langchain, the Groq client and the models takes seconds. The
+    # supervisor pays it once and every forked child inherits the result.
+    started = time.perf_counter()
+    for name in JOB_MODULES:
+        importlib.import_module(name)
+    logger.info(f"Preloaded job modules in {time.perf_counter() - started:.2f}s")
+
+
+def _warm_up():
+    # Clients hold sockets and threads, which don't survive a fork, so each
+    # child builds its own once, before taking its first job.
+    from multi_agent_reviewer.db import engine
+    from multi_agent_reviewer.services import llm_review_agent
+    from multi_agent_reviewer.services.analyzer_engine import warm_pool
+    from multi_agent_reviewer.utils.github_client import get_client
+
+    engine.dispose(close=False)
+    get_client()
+    llm_review_agent.get_llm()
+    warm_pool()
+
+
+def _work():
+    from multi_agent_reviewer.services.analyzer_engine import shutdown_pool
+    from multi_agent_reviewer.utils.github_client import retry_when_rate_limited
+    from multi_agent_reviewer.utils.metrics import record_failure
+
+    started = time.perf_counter()
+    # The supervisor's handlers don't apply here; RQ installs its own.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    redis_conn = Redis.from_url(settings.redis_url)
+    # Jobs run in this process, so they share its warm clients and analyzer
+    # pool. The process itself is what isolates a crash from the others.
+    queues = [Queue(connection=redis_conn)]
+    if not settings.llm_dedicated_worker:
+        queues.append(Queue("llm", connection=redis_conn))
+
+    worker = SimpleWorker(
+        queues,
+        connection=redis_conn,
+        exception_handlers=[record_failure, retry_when_rate_limited],
+    )
+    _warm_up()
+    logger.info(
+        f"Worker process {os.getpid()} ready in "
+        f"{(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+    try:
+        worker.work(with_scheduler=True, max_jobs=settings.worker_max_jobs or None)
+    finally:
+        shutdown_pool()
+
+
+def _spawn() -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    code = 0
+    try:
+        _work()
+    except BaseException:
+        logger.exception(f"Worker process {os.getpid()} failed")
+        code = 1
+    finally:
+        os._exit(code)
+
 
 def run_worker():
-    queue = Queue(connection=redis_conn)
-    worker = Worker([queue])
+    preload()
+    children = {_spawn() for _ in range(settings.worker_processes)}
+    stopping = False
 
     def _graceful(signum, frame):
+        nonlocal stopping
         logger.info("Received signal %s, shutting down gracefully...", signum)
-        worker.request_stop(signum, frame)
+        stopping = True
+        # Each child finishes the job it is on, then exits.
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
 
     signal.signal(signal.SIGTERM, _graceful)
     signal.signal(signal.SIGINT, _graceful)
 
-    worker.work(with_scheduler=True)
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        code = os.waitstatus_to_exitcode(status)
+
+        if stopping:
+            continue
+
+        if code:
+            logger.warning(f"Worker process {pid} died ({code}), replacing it")
+            # Don't spin if children die on startup, e.g. with Redis down.
+            time.sleep(1)
+        else:
+            logger.info(f"Worker process {pid} recycled")
+
+        children.add(_spawn())
 
 
 if __name__ == "__main__":
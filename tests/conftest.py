@@ -0,0 +1,5 @@
+import os
+
+# Modules build their Redis clients at import time; from_url doesn't connect,
+# so any URL lets them import. Tests that need Redis use fakeredis.
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
@@ -0,0 +1,117 @@
+from multi_agent_reviewer.utils.diff_utils import (
+    changed_line_ranges,
+    in_ranges,
+    index_unified_diff,
+    iter_unified_diff,
+    parse_unified_diff,
+)
+
+DIFF = """\
+diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,3 +1,4 @@
+ import os
++import sys
+ # entry point
+ def main():
+@@ -10,2 +11,2 @@ def main():
+-    return 1
++    return 0
+ # end
+diff --git a/old.py b/old.py
+--- a/old.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+--- a removed line that looks like a header
+-x = 1
+"""
+
+
+def test_parse_unified_diff():
+    files = parse_unified_diff(DIFF)
+
+    assert list(files) == ["app.py", "old.py"]
+    first, second = files["app.py"]
+    assert {k: first[k] for k in ("orig_start", "orig_len", "start", "len")} == {
+        "orig_start": 1,
+        "orig_len": 3,
+        "start": 1,
+        "len": 4,
+    }
+    assert first["lines"] == [
+        " import os",
+        "+import sys",
+        " # entry point",
+        " def main():",
+    ]
+    assert second["lines"] == ["-    return 1", "+    return 0", " # end"]
+
+
+def test_deleted_file_keeps_lines_that_look_like_headers():
+    (hunk,) = parse_unified_diff(DIFF)["old.py"]
+
+    assert hunk["lines"] == ["--- a removed line that looks like a header", "-x = 1"]
+
+
+def test_patch_without_file_headers_uses_default_file():
+    patch = "@@ -1 +1 @@\n-a\n+b"
+
+    assert parse_unified_diff(patch, default_file="x.py") == {
+        "x.py": [
+            {
+                "orig_start": 1,
+                "orig_len": 1,
+                "start": 1,
+                "len": 1,
+                "lines": ["-a", "+b"],
+            }
+        ]
+    }
+    assert parse_unified_diff(patch) == {}
+
+
+def test_streamed_chunks_parse_like_whole_text():
+    chunks = [DIFF[i : i + 7] for i in range(0, len(DIFF), 7)]
+
+    assert [(p, h.to_dict()) for p, h in iter_unified_diff(chunks)] == [
+        (p, h.to_dict()) for p, h in iter_unified_diff(DIFF)
+    ]
+
+
+def test_hunk_positions():
+    first, second = [h for path, h in iter_unified_diff(DIFF) if path == "app.py"]
+
+    # The first @@ header is position 0 and each diff line after it counts one.
+    assert first.position == 0
+    assert second.position == 5
+    assert [first.position_of(n) for n in range(1, 5)] == [1, 2, 3, 4]
+    assert second.position_of(11) == 7
+    assert second.position_of(12) == 8
+    assert first.position_of(5) is None
+    assert len(second) == 3
+    assert second.new_line_count() == 2
+
+
+def test_diff_index_locates_lines():
+    index = index_unified_diff(DIFF)["app.py"]
+
+    assert index.locate(2) == (0, 2)
+    assert index.locate(11) == (1, 7)
+    assert index.locate(8) is None
+
+
+def test_changed_line_ranges():
+    ranges = changed_line_ranges(parse_unified_diff(DIFF)["app.py"])
+
+    assert ranges == [(2, 2), (11, 11)]
+    assert in_ranges(2, ranges)
+    assert in_ranges(11, ranges)
+    assert not in_ranges(3, ranges)
+    assert not in_ranges(1, ranges)
+
+
+def test_changed_line_ranges_merges_adjacent_additions():
+    hunk = {"start": 5, "lines": ["+a", "+b", " c", "-d", "+e"]}
+
+    assert changed_line_ranges([hunk]) == [(5, 6), (8, 8)]
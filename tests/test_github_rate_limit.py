@@ -0,0 +1,78 @@
+import fakeredis
+import pytest
+
+from multi_agent_reviewer.config import settings
+from multi_agent_reviewer.utils import github_client
+from multi_agent_reviewer.utils.github_client import (
+    RateLimitExceeded,
+    _bucket_key,
+    _wait_for_budget,
+)
+
+NOW = 1_000_000.0
+KEY = _bucket_key("installation:1")
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(github_client, "redis", fake)
+    monkeypatch.setattr(
+        github_client, "_ACQUIRE", fake.register_script(github_client._ACQUIRE.script)
+    )
+    return fake
+
+
+def acquire(now=NOW, reserve=0, burst=0, min_interval=1.0) -> float:
+    return float(
+        github_client._ACQUIRE(keys=[KEY], args=[now, reserve, burst, min_interval])
+    )
+
+
+def test_requests_are_spaced_by_the_minimum_interval(redis):
+    assert [acquire() for _ in range(3)] == [0, 1, 2]
+
+
+def test_burst_lets_requests_through_back_to_back(redis):
+    assert [acquire(burst=2) for _ in range(5)] == [0, 0, 0, 1, 2]
+
+
+def test_remaining_budget_is_spread_until_the_reset(redis):
+    redis.hset(KEY, mapping={"remaining": 11, "reset": NOW + 100})
+
+    # Ten requests left above the reserve of one, over 100 seconds; each one
+    # sent leaves fewer for the same time.
+    assert acquire(reserve=1) == 0
+    assert acquire(reserve=1) == 10
+    assert acquire(reserve=1) == pytest.approx(10 + 100 / 9)
+    assert redis.hget(KEY, "remaining") == "8"
+
+
+def test_reserve_waits_for_the_reset(redis):
+    redis.hset(KEY, mapping={"remaining": 5, "reset": NOW + 600})
+
+    assert acquire(reserve=5) == 600
+    assert redis.hget(KEY, "remaining") == "5"
+
+
+def test_past_reset_is_ignored(redis):
+    redis.hset(KEY, mapping={"remaining": 0, "reset": NOW - 1})
+
+    assert acquire() == 0
+
+
+def test_blocked_bucket_waits(redis):
+    redis.hset(KEY, "blocked_until", NOW + 30)
+
+    assert acquire() == 30
+    assert acquire(now=NOW + 31) == 0
+
+
+def test_long_waits_raise_instead_of_sleeping(redis, monkeypatch):
+    monkeypatch.setattr(settings, "github_max_backoff", 60)
+    redis.hset(KEY, mapping={"remaining": 0, "reset": 4_000_000_000})
+
+    with pytest.raises(RateLimitExceeded) as exc:
+        _wait_for_budget("installation:1")
+
+    assert exc.value.wait > 60
@@ -0,0 +1,44 @@
+import pytest
+
+from multi_agent_reviewer.utils.incremental import shift_line
+
+
+def _hunk(orig_start: int, orig_len: int, start: int, length: int) -> dict:
+    return {
+        "orig_start": orig_start,
+        "orig_len": orig_len,
+        "start": start,
+        "len": length,
+    }
+
+
+# Lines 10-11 became three lines, then three lines went in after line 20 and
+# line 30 was deleted.
+DELTA = [_hunk(10, 2, 10, 3), _hunk(20, 0, 22, 3), _hunk(30, 1, 32, 0)]
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (1, 1),
+        (9, 9),
+        (10, None),
+        (11, None),
+        (12, 13),
+        (20, 21),
+        (21, 25),
+        (29, 33),
+        (30, None),
+        (31, 34),
+    ],
+)
+def test_shift_line(line, expected):
+    assert shift_line(line, DELTA) == expected
+
+
+def test_no_delta_keeps_lines():
+    assert shift_line(42, []) == 42
+
+
+def test_insertion_at_top_of_file():
+    assert shift_line(1, [_hunk(0, 0, 1, 2)]) == 3
@@ -0,0 +1,113 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from multi_agent_reviewer.config import settings
+from multi_agent_reviewer.utils import llm_rate_limiter
+from multi_agent_reviewer.utils.llm_rate_limiter import BUCKET_KEY, _reserve
+
+RPM = 60
+TPM = 600
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(llm_rate_limiter, "redis", fake)
+    monkeypatch.setattr(
+        llm_rate_limiter,
+        "_ACQUIRE",
+        fake.register_script(llm_rate_limiter._ACQUIRE.script),
+    )
+    monkeypatch.setattr(settings, "llm_rpm", RPM)
+    monkeypatch.setattr(settings, "llm_tpm", TPM)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch, redis):
+    clock = FakeClock(1_000_000.0)
+    monkeypatch.setattr(llm_rate_limiter, "time", clock)
+    return clock
+
+
+def test_full_bucket_has_no_wait(clock):
+    assert _reserve(100) == 0
+
+
+def test_requests_run_out_after_a_minutes_quota(clock):
+    assert [_reserve(1) for _ in range(RPM)] == [0] * RPM
+    # One request refills every 60 / RPM seconds.
+    assert _reserve(1) == pytest.approx(1)
+    assert _reserve(1) == pytest.approx(2)
+
+
+def test_tokens_run_out(clock):
+    assert _reserve(TPM) == 0
+    # 300 tokens in debt, refilling at TPM a minute.
+    assert _reserve(300) == pytest.approx(30)
+
+
+def test_cost_is_capped_at_the_quota(clock, redis):
+    # Otherwise a prompt larger than the quota could never go out.
+    assert _reserve(10 * TPM) == 0
+    assert float(redis.hget(BUCKET_KEY, "tokens")) == 0
+
+
+def test_bucket_refills_over_time(clock):
+    _reserve(TPM)
+    _reserve(300)
+
+    clock.now += 15
+    assert _reserve(0, dry_run=True) == pytest.approx(15)
+    clock.now += 15
+    assert _reserve(0, dry_run=True) == 0
+
+
+def test_refill_is_capped_at_the_quota(clock):
+    _reserve(1)
+    clock.now += 3600
+
+    assert [_reserve(1) for _ in range(RPM)] == [0] * RPM
+    assert _reserve(1) > 0
+
+
+def test_dry_run_reserves_nothing(clock, redis):
+    _reserve(TPM)
+    _reserve(300)
+    state = redis.hgetall(BUCKET_KEY)
+
+    assert _reserve(0, dry_run=True) == pytest.approx(30)
+    assert _reserve(0, dry_run=True) == pytest.approx(30)
+    assert redis.hgetall(BUCKET_KEY) == state
+
+
+def test_settle_returns_unused_tokens(clock, redis):
+    _reserve(TPM)
+    asyncio.run(llm_rate_limiter.settle(estimated=TPM, used=100))
+
+    assert float(redis.hget(BUCKET_KEY, "tokens")) == TPM - 100
+    assert _reserve(0, dry_run=True) == 0
+
+
+def test_wait_for_capacity_blocks_until_out_of_debt(clock):
+    _reserve(TPM)
+    _reserve(300)
+    started = clock.now
+
+    llm_rate_limiter.wait_for_capacity()
+
+    assert clock.now - started == pytest.approx(30)
+    assert _reserve(0, dry_run=True) == 0
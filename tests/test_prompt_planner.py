@@ -0,0 +1,83 @@
+from multi_agent_reviewer.utils.prompt_planner import (
+    estimate_tokens,
+    plan_batches,
+    render_hunk,
+    render_hunks,
+)
+
+
+def _hunk(start: int, size: int) -> dict:
+    # Each line is 40 characters with its newline, so 10 tokens.
+    return {
+        "orig_start": start,
+        "orig_len": size,
+        "start": start,
+        "len": size,
+        "lines": ["+" + "x" * 38] * size,
+    }
+
+
+def _hunk_tokens(hunk: dict) -> int:
+    return estimate_tokens(render_hunk(hunk))
+
+
+def test_render_hunks_skips_empty_files():
+    hunk = {"orig_start": 1, "orig_len": 1, "start": 1, "len": 1, "lines": ["+a"]}
+
+    assert render_hunks({"a.py": [hunk], "b.py": []}) == (
+        "--- a/a.py\n+++ b/a.py\n@@ -1,1 +1,1 @@\n+a\n"
+    )
+
+
+def test_every_hunk_is_planned_once():
+    changed = {f"f{i}.py": [_hunk(1, i + 1), _hunk(100, 2)] for i in range(6)}
+
+    batches = plan_batches(changed, budget=60)
+    planned = [
+        (path, h["start"]) for b in batches for path, hs in b.hunks.items() for h in hs
+    ]
+
+    assert sorted(planned) == sorted(
+        (path, h["start"]) for path, hs in changed.items() for h in hs
+    )
+
+
+def test_batches_stay_within_budget():
+    changed = {f"f{i}.py": [_hunk(1, 2), _hunk(50, 1)] for i in range(10)}
+
+    batches = plan_batches(changed, budget=100)
+
+    assert len(batches) > 1
+    assert all(b.tokens <= 100 for b in batches)
+
+
+def test_files_that_fit_are_not_split():
+    changed = {"a.py": [_hunk(1, 3), _hunk(20, 3)], "b.py": [_hunk(1, 5)]}
+
+    batches = plan_batches(changed, budget=80)
+
+    for path in changed:
+        assert sum(path in b.hunks for b in batches) == 1
+
+
+def test_large_file_is_split_at_hunk_boundaries():
+    hunks = [_hunk(i * 10, 3) for i in range(5)]
+
+    batches = plan_batches({"big.py": hunks}, budget=80)
+
+    assert len(batches) > 1
+    assert [h for b in batches for h in b.hunks["big.py"]] == hunks
+    assert all(b.tokens <= 80 for b in batches)
+
+
+def test_hunk_over_budget_gets_its_own_batch():
+    huge, small = _hunk(1, 50), _hunk(100, 1)
+
+    batches = plan_batches({"a.py": [huge, small]}, budget=40)
+
+    assert _hunk_tokens(huge) > 40
+    assert [b.hunks["a.py"] for b in batches] == [[huge], [small]]
+
+
+def test_no_hunks_no_batches():
+    assert plan_batches({"a.py": []}, budget=100) == []
@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from multi_agent_reviewer.main import _decode_cursor, _encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 18, 14, 37, 5, 602118)
+
+    assert _decode_cursor(_encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = _encode_cursor(datetime(2026, 1, 1), 2**40)
+
+    assert not set(cursor) & set("+/")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        base64.urlsafe_b64encode(b"[1]").decode(),
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        base64.urlsafe_b64encode(b'["yesterday", 2]').decode(),
+        base64.urlsafe_b64encode(b'["2026-01-01T00:00:00", "x"]').decode(),
+    ],
+)
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(cursor)
+
+    assert exc.value.status_code == 400